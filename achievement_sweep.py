@@ -0,0 +1,277 @@
+"""
+Fleet-wide Achievement Sweep
+----------------------------
+Evaluates the achievement rules for every user without calling
+`check_achievements` once per user.
+
+- One `$group` pass over GrowAI.dream_logs produces per-user dream stats
+  (count, unread, late-night / glitch / misty flags), sorted by user_id.
+- A cursor over `users` (sorted by user_id) is merged with those stats, so
+  neither side is held in memory.
+- Chunks of users are evaluated and written by a process pool; each chunk
+  reads the users' existing unlocks once and writes new ones with one
+  `bulk_write` per collection (duplicates are rejected by the unique index,
+  points are summed per user) and stores the unlocked set in
+  `achievement_state`, so later checks skip those rules.
+- Progress (users, unlocks, users/s) is printed every few seconds and a
+  checkpoint (last fully processed user_id) is stored in
+  `achievement_sweep`, so an interrupted sweep resumes where it stopped.
+
+Usage (from the project root):
+    python achievement_sweep.py             # resume or start
+    python achievement_sweep.py --restart   # ignore the checkpoint
+    python achievement_sweep.py --workers 8 --chunk-size 500
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pymongo import InsertOne, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from achievement_config import ACHIEVEMENTS_BY_ID, ANIMATED_IDS
+from check_achievements import (
+    DREAM_STATS_RULES, DUPLICATE_KEY, MONGO_URI, achievement_collection, db_user, dream_log_collection,
+    ensure_indexes, state_collection, user_collection
+)
+from dream_stats import EMPTY_STATS, stats_pipeline
+
+CHECKPOINT_ID = "sweep"
+checkpoint_collection = db_user["achievement_sweep"]
+
+
+def dream_stats_pipeline(after: Optional[str] = None) -> List[Dict]:
+    """Per-user dream stats (see dream_stats) in one $group pass, sorted by user_id."""
+    match = {"user_id": {"$gt": after}} if after is not None else {"user_id": {"$exists": True}}
+    return stats_pipeline(match) + [{"$sort": {"_id": 1}}]
+
+
+def iter_user_rows(after: Optional[str] = None) -> Iterator[Tuple[str, Dict, int]]:
+    """(user_id, dream stats, avatar_count) for every user, merged from two sorted cursors."""
+    user_query = {"user_id": {"$gt": after}} if after is not None else {"user_id": {"$exists": True}}
+    users = user_collection.find(user_query, {"_id": 0, "user_id": 1, "avatar_count": 1}).sort("user_id", 1)
+    stats = dream_log_collection.aggregate(dream_stats_pipeline(after), allowDiskUse=True)
+
+    pending = next(stats, None)
+    for user in users:
+        user_id = user["user_id"]
+        # Skip stats of dream owners with no users document
+        while pending is not None and pending["_id"] < user_id:
+            pending = next(stats, None)
+        if pending is not None and pending["_id"] == user_id:
+            yield user_id, pending, user.get("avatar_count", 0)
+            pending = next(stats, None)
+        else:
+            yield user_id, EMPTY_STATS, user.get("avatar_count", 0)
+
+
+def evaluate_stats(stats: Dict, avatar_count: int, unlocked: set) -> List[str]:
+    """Achievement ids newly met by one user."""
+    newly = [key for key, rule in DREAM_STATS_RULES.items() if key not in unlocked and rule(stats)]
+    if "AVATAR_MASTER" not in unlocked and avatar_count >= 5:
+        newly.append("AVATAR_MASTER")
+    if "PIXEL_COLLECTOR" not in unlocked and len((unlocked | set(newly)) & ANIMATED_IDS) >= 3:
+        newly.append("PIXEL_COLLECTOR")
+    return newly
+
+
+def process_chunk(rows: List[Tuple[str, Dict, int]], collections=None) -> Tuple[int, int]:
+    """Evaluate and write one chunk of users. Returns (users, unlocks written)."""
+    achievements, users, states = collections or _worker_collections
+    user_ids = [row[0] for row in rows]
+    unlocked: Dict[str, set] = {user_id: set() for user_id in user_ids}
+    for entry in achievements.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "achievement_id": 1}):
+        unlocked[entry["user_id"]].add(entry["achievement_id"])
+
+    now = datetime.utcnow()
+    pairs = [(user_id, achievement_id) for user_id, stats, avatar_count in rows
+             for achievement_id in evaluate_stats(stats, avatar_count, unlocked[user_id])]
+    if not pairs:
+        _save_states(states, rows, unlocked, now)
+        return len(rows), 0
+
+    rejected = set()
+    try:
+        achievements.bulk_write([InsertOne({
+            "user_id": user_id,
+            "achievement_id": achievement_id,
+            "unlocked_at": now,
+            "points": ACHIEVEMENTS_BY_ID[achievement_id]["points"],
+        }) for user_id, achievement_id in pairs], ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        rejected = {error["index"] for error in errors}
+
+    # A rejected duplicate was unlocked concurrently: it counts as unlocked, its points were already given
+    points: Dict[str, int] = {}
+    for index, (user_id, achievement_id) in enumerate(pairs):
+        unlocked[user_id].add(achievement_id)
+        if index not in rejected:
+            points[user_id] = points.get(user_id, 0) + ACHIEVEMENTS_BY_ID[achievement_id]["points"]
+    if points:
+        users.bulk_write([UpdateOne({"user_id": user_id}, {"$inc": {"achievement_points": total}})
+                          for user_id, total in points.items()], ordered=False)
+    _save_states(states, rows, unlocked, now)
+    return len(rows), len(pairs) - len(rejected)
+
+
+def _save_states(states, rows, unlocked: Dict[str, set], now: datetime):
+    """Record each user's full unlocked set as the checker's state."""
+    states.bulk_write([UpdateOne(
+        {"user_id": user_id},
+        {"$addToSet": {"unlocked": {"$each": sorted(unlocked[user_id])}},
+         "$set": {"complete": True, "updated_at": now}},
+        upsert=True
+    ) for user_id, _, _ in rows], ordered=False)
+
+
+# Worker processes open their own client (MongoClient is not fork-safe)
+_worker_collections = None
+
+
+def _init_worker():
+    global _worker_collections
+    db = MongoClient(MONGO_URI)["user_data"]
+    _worker_collections = (db["achievement_log"], db["users"], db["achievement_state"])
+
+
+def _chunks(rows: Iterator, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class SweepProgress:
+    """Counters, periodic progress lines and the resumable checkpoint."""
+
+    def __init__(self, total: int, resumed_from: Optional[str], report_seconds: float):
+        self.total = total
+        self.resumed_from = resumed_from
+        self.report_seconds = report_seconds
+        self.users = 0
+        self.unlocks = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        # Chunks finish out of order; the checkpoint only covers a contiguous prefix
+        self.last_user_of_chunk: Dict[int, str] = {}
+        self.done: Dict[int, Tuple[int, int]] = {}  # finished, not yet committed: seq -> (users, unlocks)
+        self.next_to_commit = 0
+
+    def chunk_started(self, seq: int, last_user_id: str):
+        self.last_user_of_chunk[seq] = last_user_id
+
+    def chunk_finished(self, seq: int, users: int, unlocks: int):
+        self.users += users
+        self.unlocks += unlocks
+        self.done[seq] = (users, unlocks)
+        checkpoint = None
+        committed_users = committed_unlocks = 0
+        while self.next_to_commit in self.done:
+            chunk_users, chunk_unlocks = self.done.pop(self.next_to_commit)
+            committed_users += chunk_users
+            committed_unlocks += chunk_unlocks
+            checkpoint = self.last_user_of_chunk.pop(self.next_to_commit)
+            self.next_to_commit += 1
+        if checkpoint is not None:
+            checkpoint_collection.update_one(
+                {"_id": CHECKPOINT_ID},
+                {"$set": {"last_user_id": checkpoint, "updated_at": datetime.utcnow(), "status": "running"},
+                 "$inc": {"users": committed_users, "unlocks": committed_unlocks}},
+                upsert=True,
+            )
+        now = time.perf_counter()
+        if now - self.last_report >= self.report_seconds:
+            self.last_report = now
+            print("[Achievement Sweep]", self.summary())
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.users / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "users": self.users,
+            "total": self.total,
+            "percent": round(100 * self.users / self.total, 1) if self.total else 100.0,
+            "unlocks": self.unlocks,
+            "users_per_second": round(self.rate(), 1),
+            "seconds": round(time.perf_counter() - self.started, 1),
+            "resumed_from": self.resumed_from,
+        }
+
+
+def run_sweep(workers: int = os.cpu_count() or 1, chunk_size: int = 500, restart: bool = False,
+              report_seconds: float = 5.0) -> Dict:
+    """
+    Sweep all users (resuming after the checkpoint unless `restart`).
+    `workers=0` evaluates chunks in this process.
+    """
+    ensure_indexes()
+    user_collection.create_index("user_id")
+
+    if restart:
+        checkpoint_collection.delete_one({"_id": CHECKPOINT_ID})
+    checkpoint = checkpoint_collection.find_one({"_id": CHECKPOINT_ID}) or {}
+    after = checkpoint.get("last_user_id") if checkpoint.get("status") == "running" else None
+    if after is None:
+        checkpoint_collection.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"status": "running", "started_at": datetime.utcnow(), "last_user_id": None,
+                      "users": 0, "unlocks": 0}},
+            upsert=True,
+        )
+
+    remaining = user_collection.count_documents(
+        {"user_id": {"$gt": after}} if after is not None else {"user_id": {"$exists": True}})
+    progress = SweepProgress(remaining, after, report_seconds)
+    print(f"[Achievement Sweep] {'Resuming after ' + repr(after) if after else 'Starting'}: "
+          f"{remaining} users, {workers} workers, chunks of {chunk_size}")
+
+    chunks = enumerate(_chunks(iter_user_rows(after), chunk_size))
+    if workers <= 0:
+        collections = (achievement_collection, user_collection, state_collection)
+        for seq, chunk in chunks:
+            progress.chunk_started(seq, chunk[-1][0])
+            progress.chunk_finished(seq, *process_chunk(chunk, collections))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+            in_flight = {}
+            for seq, chunk in chunks:
+                progress.chunk_started(seq, chunk[-1][0])
+                in_flight[pool.submit(process_chunk, chunk)] = seq
+                # Bound memory: keep at most two chunks per worker queued
+                while len(in_flight) >= 2 * workers:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        progress.chunk_finished(in_flight.pop(future), *future.result())
+            for future in list(in_flight):
+                progress.chunk_finished(in_flight.pop(future), *future.result())
+
+    checkpoint_collection.update_one({"_id": CHECKPOINT_ID},
+                                     {"$set": {"status": "finished", "finished_at": datetime.utcnow()}})
+    summary = progress.summary()
+    print("[Achievement Sweep] Done:", summary)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate achievements for all users.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="process pool size (0 = inline)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="users per chunk / bulk write")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and sweep everyone")
+    parser.add_argument("--report-seconds", type=float, default=5.0, help="progress line interval")
+    args = parser.parse_args()
+    run_sweep(args.workers, args.chunk_size, args.restart, args.report_seconds)
@@ -1,13 +1,16 @@
 from fastapi import FastAPI
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+from bson import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime
 import os
 import random
 from fastapi.responses import JSONResponse
-from database.achievement_config import ACHIEVEMENTS
-from database.check_achievements import check_achievements
+from database.achievement_config import ACHIEVEMENTS, ACHIEVEMENTS_BY_ID, ANIMATED_IDS
+from database.check_achievements import check_achievements, reset_state
 
 app = FastAPI()
 LOTTERY_COST = 100
@@ -15,7 +18,7 @@ LOTTERY_COST = 100
 env_path = Path(__file__).parent / ".env_user"
 load_dotenv(dotenv_path=env_path)
 MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["user_data"]
 achievement_log = db["achievement_log"]
 users = db["users"]
@@ -37,52 +40,202 @@ def get_achievement_progress(user_id: str):
         "can_draw": can_draw
     }
 
-def check_and_draw_lottery(user_id: str):
-    user = users.find_one({"user_id": user_id})
-    if not user:
-        return JSONResponse(content={"error": "user not found"}, status_code=404)
+PRIZE_IDS = [
+    "digital_stamp_A",
+    "digital_stamp_B",
+    "full_physical_set",
+    "full_physical_set_seed"
+]
+PRIZE_WEIGHTS = [0.5, 0.3, 0.15, 0.05]
 
-    points = user.get("achievement_points", 0)
-    if points < LOTTERY_COST:
-        return JSONResponse(content={"status": "not enough points"}, status_code=200)
+PRIZE_INFO = {
+    "digital_stamp_A": "Hidden Digital Stamp A",
+    "digital_stamp_B": "Hidden Digital Stamp B",
+    "full_physical_set": "Full Physical Stamp Set",
+    "full_physical_set_seed": "Full Set + Dream Seed Bottle"
+}
 
-    prize_ids = [
-        "digital_stamp_A",
-        "digital_stamp_B",
-        "full_physical_set",
-        "full_physical_set_seed"
-    ]
-    weights = [0.5, 0.3, 0.15, 0.05]
-
-    PRIZE_INFO = {
-        "digital_stamp_A": "Hidden Digital Stamp A",
-        "digital_stamp_B": "Hidden Digital Stamp B",
-        "full_physical_set": "Full Physical Stamp Set",
-        "full_physical_set_seed": "Full Set + Dream Seed Bottle"
-    }
+MAX_DRAWS = int(os.getenv("LOTTERY_MAX_DRAWS", "10"))
+
+ANIMATED_ID_LIST = sorted(ANIMATED_IDS)
+
+# Draws deduct points and log prizes in one transaction. Transactions need a
+# replica set or mongos; a standalone server answers IllegalOperation, and
+# draws then fall back to refunding whatever was not logged
+ILLEGAL_OPERATION = 20
+_transactions_supported = True
+
+# History pages: newest first, keyset on (time, _id)
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        users.create_index("user_id")
+        lottery_log.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)])
+        achievement_log.create_index([("user_id", 1), ("unlocked_at", -1), ("_id", -1)])
+        _indexes_ready = True
+
+def encode_cursor(doc, time_field):
+    return f"{doc[time_field].isoformat()}_{doc['_id']}"
 
-    chosen_id = random.choices(prize_ids, weights=weights, k=1)[0]
-    reward_label = PRIZE_INFO[chosen_id]
+def decode_cursor(cursor):
+    """(datetime, ObjectId) from encode_cursor, or None if malformed."""
+    try:
+        ts, oid = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), ObjectId(oid)
+    except (ValueError, InvalidId):
+        return None
 
-    lottery_log.insert_one({
+def history_page(collection, user_id, time_field, projection, limit, cursor=None):
+    """
+    One page of a user's log, newest first. Continues strictly after `cursor`
+    (the last entry of the previous page) on the (user_id, time, _id) index,
+    so every page costs the same however deep it is.
+    Returns (entries, next_cursor or None).
+    """
+    ensure_indexes()
+    query = {"user_id": user_id}
+    if cursor is not None:
+        ts, oid = cursor
+        query["$or"] = [{time_field: {"$lt": ts}}, {time_field: ts, "_id": {"$lt": oid}}]
+    entries = list(collection.find(query, {"_id": 1, time_field: 1, **projection})
+                   .sort([(time_field, -1), ("_id", -1)]).limit(limit + 1))
+    next_cursor = encode_cursor(entries[limit - 1], time_field) if len(entries) > limit else None
+    return entries[:limit], next_cursor
+
+def parse_page_args(limit, cursor):
+    """Validated (limit, decoded cursor), or a 400 JSONResponse."""
+    if not 1 <= limit <= HISTORY_MAX_LIMIT:
+        return JSONResponse(content={"error": f"limit must be between 1 and {HISTORY_MAX_LIMIT}"}, status_code=400)
+    decoded = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return JSONResponse(content={"error": "invalid cursor"}, status_code=400)
+    return limit, decoded
+
+def spend_points(user_id: str, cost: int, session=None):
+    """
+    Deduct `cost` points only if the user has them, in one conditional update,
+    so concurrent draws cannot spend the same points.
+    Returns the remaining points, or None if the user is missing or short.
+    """
+    ensure_indexes()
+    user = users.find_one_and_update(
+        {"user_id": user_id, "achievement_points": {"$gte": cost}},
+        {"$inc": {"achievement_points": -cost}},
+        projection={"achievement_points": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    return None if user is None else user["achievement_points"]
+
+def draw_in_transaction(user_id: str, cost: int, entries):
+    """
+    Deduct the points and log the draws as one transaction: both or neither.
+    Returns the remaining points, or None if the user is missing or short.
+    """
+    def deduct_and_log(session):
+        remaining = spend_points(user_id, cost, session)
+        if remaining is not None:
+            lottery_log.insert_many(entries, session=session)
+        return remaining
+
+    with client.start_session() as session:
+        return session.with_transaction(deduct_and_log)
+
+def draw_with_refund(user_id: str, cost: int, entries):
+    """
+    Without transactions: deduct, then log the draws in order. If logging
+    fails partway, only the draws that were not logged are refunded.
+    Returns (remaining points or None, number of draws logged).
+    """
+    remaining = spend_points(user_id, cost)
+    if remaining is None:
+        return None, 0
+    try:
+        lottery_log.insert_many(entries)  # ordered: stops at the first failed draw
+        return remaining, len(entries)
+    except BulkWriteError as e:
+        logged = e.details.get("nInserted", 0)
+        print("[Lottery] Draw log failed partway:", e)
+    except Exception as e:
+        # e.g. connection lost mid-write: count what reached the log (insert_many set the _ids)
+        print("[Lottery] Draw log failed:", e)
+        logged = lottery_log.count_documents({"_id": {"$in": [entry["_id"] for entry in entries if "_id" in entry]}})
+
+    refund = LOTTERY_COST * (len(entries) - logged)
+    if refund:
+        users.update_one({"user_id": user_id}, {"$inc": {"achievement_points": refund}})
+    return remaining + refund, logged
+
+def check_and_draw_lottery(user_id: str, count: int = 1):
+    global _transactions_supported
+    if not 1 <= count <= MAX_DRAWS:
+        return JSONResponse(content={"error": f"count must be between 1 and {MAX_DRAWS}"}, status_code=400)
+
+    cost = LOTTERY_COST * count
+    chosen_ids = random.choices(PRIZE_IDS, weights=PRIZE_WEIGHTS, k=count)
+    now = datetime.utcnow()
+    entries = [{
         "user_id": user_id,
         "reward_id": chosen_id,
-        "reward_label": reward_label,
-        "timestamp": datetime.utcnow()
-    })
+        "reward_label": PRIZE_INFO[chosen_id],
+        "timestamp": now
+    } for chosen_id in chosen_ids]
+
+    logged = count
+    try:
+        if _transactions_supported:
+            try:
+                remaining = draw_in_transaction(user_id, cost, entries)
+            except OperationFailure as e:
+                if e.code != ILLEGAL_OPERATION:
+                    raise
+                _transactions_supported = False
+                print("[Lottery] Transactions not supported, falling back to refunds:", e)
+        if not _transactions_supported:
+            remaining, logged = draw_with_refund(user_id, cost, entries)
+    except Exception as e:
+        print("[Lottery] Draw failed:", e)
+        return JSONResponse(content={"error": "draw failed"}, status_code=500)
+
+    if remaining is None:
+        # Only the refused draw pays for telling a missing user from a short balance
+        if users.find_one({"user_id": user_id}, {"_id": 1}) is None:
+            return JSONResponse(content={"error": "user not found"}, status_code=404)
+        return JSONResponse(content={"status": "not enough points"}, status_code=200)
 
-    users.update_one({"user_id": user_id}, {"$inc": {"achievement_points": -LOTTERY_COST}})
+    if logged < count:
+        return JSONResponse(content={
+            "error": "draw failed, points for unlogged draws refunded",
+            "rewards": [{"reward_id": e["reward_id"], "reward": e["reward_label"]} for e in entries[:logged]],
+            "remaining_points": remaining
+        }, status_code=500)
+
+    if count == 1:
+        return JSONResponse(content={
+            "user_id": user_id,
+            "reward": entries[0]["reward_label"],
+            "reward_id": chosen_ids[0],
+            "status": "lottery triggered",
+            "remaining_points": remaining
+        }, status_code=200)
 
     return JSONResponse(content={
         "user_id": user_id,
-        "reward": reward_label,
-        "reward_id": chosen_id,
-        "status": "lottery triggered"
+        "rewards": [{"reward_id": e["reward_id"], "reward": e["reward_label"]} for e in entries],
+        "status": "lottery triggered",
+        "remaining_points": remaining
     }, status_code=200)
 
 @app.get("/draw_lottery/{user_id}")
-def draw_lottery(user_id: str):
-    return check_and_draw_lottery(user_id)
+def draw_lottery(user_id: str, count: int = 1):
+    return check_and_draw_lottery(user_id, count)
 
 @app.get("/get_achievement_progress/{user_id}")
 def get_progress(user_id: str):
@@ -90,22 +243,32 @@ def get_progress(user_id: str):
 
 @app.get("/latest_animated_achievement/{user_id}")
 def latest_animated_achievement(user_id: str):
-    recent = achievement_log.find({"user_id": user_id}).sort("unlocked_at", -1)
-    for entry in recent:
-        ach = next((a for a in ACHIEVEMENTS if a["id"] == entry["achievement_id"]), None)
-        if ach and ach.get("animate", False):
-            return {
-                "achievement_id": ach["id"],
-                "name": ach["name"],
-                "icon": ach["icon"],
-                "unlocked_at": entry["unlocked_at"]
-            }
-    return {"message": "No animated achievements found."}
+    # Newest first on the (user_id, unlocked_at, _id) index, stopping at the first animated entry
+    ensure_indexes()
+    entry = achievement_log.find_one(
+        {"user_id": user_id, "achievement_id": {"$in": ANIMATED_ID_LIST}},
+        {"_id": 0, "achievement_id": 1, "unlocked_at": 1},
+        sort=[("unlocked_at", -1), ("_id", -1)]
+    )
+    if entry is None:
+        return {"message": "No animated achievements found."}
+    ach = ACHIEVEMENTS_BY_ID[entry["achievement_id"]]
+    return {
+        "achievement_id": ach["id"],
+        "name": ach["name"],
+        "icon": ach["icon"],
+        "unlocked_at": entry["unlocked_at"]
+    }
 
 @app.get("/get_achievements/{user_id}")
-def get_achievements_api(user_id: str):
-    unlocked = list(achievement_log.find({"user_id": user_id}))
-    unlocked_ids = [u["achievement_id"] for u in unlocked]
+def get_achievements_api(user_id: str, limit: int = HISTORY_DEFAULT_LIMIT, cursor: str = None):
+    page_args = parse_page_args(limit, cursor)
+    if isinstance(page_args, JSONResponse):
+        return page_args
+
+    # At most one entry per achievement (unique index), so the flags read the ids only
+    unlocked_ids = {u["achievement_id"] for u in achievement_log.find(
+        {"user_id": user_id}, {"_id": 0, "achievement_id": 1})}
 
     enriched = []
     for ach in ACHIEVEMENTS:
@@ -119,18 +282,33 @@ def get_achievements_api(user_id: str):
             "unlocked": ach["id"] in unlocked_ids
         })
 
-    user = users.find_one({"user_id": user_id}) or {}
+    entries, next_cursor = history_page(achievement_log, user_id, "unlocked_at",
+                                        {"achievement_id": 1, "points": 1}, *page_args)
+    history = [{
+        "achievement_id": entry["achievement_id"],
+        "points": entry.get("points", 0),
+        "unlocked_at": entry["unlocked_at"]
+    } for entry in entries]
+
+    user = users.find_one({"user_id": user_id}, {"_id": 0, "achievement_points": 1}) or {}
     total_points = user.get("achievement_points", 0)
 
     return {
         "user_id": user_id,
         "total_points": total_points,
-        "unlocked_achievements": enriched
+        "unlocked_achievements": enriched,
+        "history": history,
+        "next_cursor": next_cursor
     }
 
 @app.get("/get_lottery_history/{user_id}")
-def get_lottery_history(user_id: str):
-    logs = list(lottery_log.find({"user_id": user_id}).sort("timestamp", -1))
+def get_lottery_history(user_id: str, limit: int = HISTORY_DEFAULT_LIMIT, cursor: str = None):
+    page_args = parse_page_args(limit, cursor)
+    if isinstance(page_args, JSONResponse):
+        return page_args
+
+    logs, next_cursor = history_page(lottery_log, user_id, "timestamp",
+                                     {"reward_id": 1, "reward_label": 1}, *page_args)
     formatted = [{
         "reward_id": log["reward_id"],
         "reward_label": log["reward_label"],
@@ -139,7 +317,8 @@ def get_lottery_history(user_id: str):
 
     return {
         "user_id": user_id,
-        "history": formatted
+        "history": formatted,
+        "next_cursor": next_cursor
     }
 
 @app.get("/check_achievements/{user_id}")
@@ -152,4 +331,112 @@ def reset_achievements(user_id: str):
     achievement_log.delete_many({"user_id": user_id})
     lottery_log.delete_many({"user_id": user_id})
     users.update_one({"user_id": user_id}, {"$set": {"achievement_points": 0}})
+    reset_state(user_id)
     return {"message": f"All achievements and points reset for {user_id}"}
+
+
+# Benchmarks (need MONGODB_URI; write and remove a "bench_lottery" user):
+#   python -m database.achievement_api draw [threads] [budget]
+#     threads drawing until the points run out, old read-check-write flow
+#     vs the conditional update: draws/s and whether points were overspent
+#   python -m database.achievement_api history [rows]
+#     lottery history latency, whole log vs first and deep keyset pages
+if __name__ == "__main__":
+    import json
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import timedelta
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else "draw"
+    bench_user = "bench_lottery"
+
+    def legacy_draw(user_id, count=1):
+        # The previous flow: read, check in Python, log, then decrement
+        user = users.find_one({"user_id": user_id})
+        if user.get("achievement_points", 0) < LOTTERY_COST:
+            return False
+        chosen_id = random.choices(PRIZE_IDS, weights=PRIZE_WEIGHTS, k=1)[0]
+        lottery_log.insert_one({"user_id": user_id, "reward_id": chosen_id,
+                                "reward_label": PRIZE_INFO[chosen_id], "timestamp": datetime.utcnow()})
+        users.update_one({"user_id": user_id}, {"$inc": {"achievement_points": -LOTTERY_COST}})
+        return True
+
+    def atomic_draw(user_id, count=1):
+        return json.loads(check_and_draw_lottery(user_id, count).body).get("status") == "lottery triggered"
+
+    def run(name, draw, count=1):
+        users.update_one({"user_id": bench_user}, {"$set": {"achievement_points": budget * LOTTERY_COST}}, upsert=True)
+        lottery_log.delete_many({"user_id": bench_user})
+
+        def worker(_):
+            while draw(bench_user, count):
+                pass
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, range(threads)))
+        seconds = time.perf_counter() - start
+        logged = lottery_log.count_documents({"user_id": bench_user})
+        points = users.find_one({"user_id": bench_user})["achievement_points"]
+        print(f"{name:22s}: {logged / seconds:8.0f} draws/s | {logged} draws logged for a budget of {budget} "
+              f"| {points} points left | overspent: {logged > budget or points < 0}")
+
+    def timed(fn, runs=20):
+        start = time.perf_counter()
+        for _ in range(runs):
+            result = fn()
+        return (time.perf_counter() - start) / runs * 1000, result
+
+    def bench_history(rows):
+        lottery_log.delete_many({"user_id": bench_user})
+        start = datetime.utcnow()
+        lottery_log.insert_many([{
+            "user_id": bench_user,
+            "reward_id": PRIZE_IDS[i % len(PRIZE_IDS)],
+            "reward_label": PRIZE_INFO[PRIZE_IDS[i % len(PRIZE_IDS)]],
+            # Groups of 10 share a timestamp, like bulk draws
+            "timestamp": start - timedelta(seconds=i // 10)
+        } for i in range(rows)])
+        ensure_indexes()
+
+        def whole_log():
+            # The previous implementation
+            return list(lottery_log.find({"user_id": bench_user}).sort("timestamp", -1))
+
+        ms, logs = timed(whole_log)
+        print(f"whole log ({len(logs)} rows)      : {ms:8.2f} ms")
+        ms, page = timed(lambda: get_lottery_history(bench_user))
+        print(f"first page ({len(page['history'])} rows)      : {ms:8.2f} ms")
+
+        cursor, seen = None, 0
+        while True:
+            page = get_lottery_history(bench_user, HISTORY_MAX_LIMIT, cursor)
+            seen += len(page["history"])
+            if page["next_cursor"] is None or seen >= rows - HISTORY_MAX_LIMIT:
+                break
+            cursor = page["next_cursor"]
+        ms, page = timed(lambda: get_lottery_history(bench_user, HISTORY_DEFAULT_LIMIT, cursor))
+        print(f"page after row {seen:6d} ({len(page['history'])} rows): {ms:8.2f} ms")
+
+        cursor, walked = None, []
+        while True:
+            page = get_lottery_history(bench_user, HISTORY_MAX_LIMIT, cursor)
+            walked += [(h["timestamp"], h["reward_id"]) for h in page["history"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        print(f"walking every page returns {len(walked)} of {rows} rows")
+
+    try:
+        if mode == "history":
+            bench_history(int(sys.argv[2]) if len(sys.argv) > 2 else 20_000)
+        else:
+            threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+            budget = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+            run("read-check-write", legacy_draw)
+            run("conditional update", atomic_draw)
+            run("conditional update x10", atomic_draw, 10)
+    finally:
+        users.delete_one({"user_id": bench_user})
+        lottery_log.delete_many({"user_id": bench_user})
@@ -71,3 +71,7 @@ ACHIEVEMENTS = [
         "animate": False
     }
 ]
+
+# Compiled at import: catalog by id, and the animated achievement ids
+ACHIEVEMENTS_BY_ID = {a["id"]: a for a in ACHIEVEMENTS}
+ANIMATED_IDS = frozenset(a["id"] for a in ACHIEVEMENTS if a.get("animate", False))
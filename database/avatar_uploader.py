@@ -18,13 +18,13 @@ import uuid
 import os
 from pymongo import MongoClient
 from database.community_db_manager import count_unread_dreams
-from database.check_achievements import check_achievements
+from database.check_achievements import on_avatar_uploaded
 
 MONGO_URI = os.getenv("MONGODB_URI")  
 
 
 app = FastAPI()
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["user_data"]
 collection = db["users"]
 
@@ -68,7 +68,7 @@ async def upload_avatar(user_id: str = Form(...), file: UploadFile = File(...)):
         return JSONResponse(status_code=404, content={"error": f"User '{user_id}' not found."})
 
    
-    check_achievements(user_id)
+    on_avatar_uploaded(user_id)
 
     return {
         "user_id": user_id,
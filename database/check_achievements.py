@@ -4,10 +4,14 @@
 # Last Updated: 2025-05-26
 # This script checks unlocked achievements for a user,
 # compares against config, and inserts new records into MongoDB.
+# Checks skip rules already unlocked (achievement_state keeps the unlocked
+# set) and read the user's dream_stats document instead of dream_logs.
 
-from datetime import datetime, time
-from pymongo import MongoClient
-from database.achievement_config import ACHIEVEMENTS
+from datetime import datetime
+from pymongo import InsertOne, MongoClient
+from pymongo.errors import BulkWriteError, OperationFailure
+from database.achievement_config import ACHIEVEMENTS_BY_ID, ANIMATED_IDS
+from database.dream_stats import get_dream_stats, stats_collection
 from pathlib import Path
 from dotenv import load_dotenv
 import os
@@ -17,7 +21,7 @@ load_dotenv(dotenv_path=env_path)
 
 # Connect to MongoDB
 MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 
 # Reference two databases
 db_user = client["user_data"]
@@ -27,73 +31,173 @@ db_dream = client["GrowAI"]
 achievement_collection = db_user["achievement_log"]
 user_collection = db_user["users"]
 dream_log_collection = db_dream["dream_logs"]
+# Per-user unlocked set
+state_collection = db_user["achievement_state"]
 
-# Check if already unlocked
-def has_achievement(user_id, achievement_id):
-    return achievement_collection.count_documents({
-        "user_id": user_id,
-        "achievement_id": achievement_id
-    }) > 0
+DUPLICATE_KEY = 11000
+
+# Unlock and write to MongoDB: one bulk insert for the whole run, duplicates
+# rejected by the unique (user_id, achievement_id) index, one summed $inc
+def unlock_many(user_id, achievement_ids):
+    ensure_indexes()  # the unique index is the only duplicate guard
+    achs = [ACHIEVEMENTS_BY_ID[i] for i in dict.fromkeys(achievement_ids) if i in ACHIEVEMENTS_BY_ID]
+    if not achs:
+        return []
+    now = datetime.utcnow()
+    rejected = set()
+    try:
+        achievement_collection.bulk_write([InsertOne({
+            "user_id": user_id,
+            "achievement_id": ach["id"],
+            "unlocked_at": now,
+            "points": ach["points"]
+        }) for ach in achs], ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        rejected = {error["index"] for error in errors}
+
+    inserted = [ach for index, ach in enumerate(achs) if index not in rejected]
+    points = sum(ach["points"] for ach in inserted)
+    if points:
+        user_collection.update_one(
+            {"user_id": user_id},
+            {"$inc": {"achievement_points": points}},
+            upsert=True
+        )
+    for ach in inserted:
+        print(f"{user_id} unlocked: {ach['name']}")
+    return [ach["id"] for ach in inserted]
 
-# Unlock and write to MongoDB
 def unlock(user_id, achievement_id):
-    if has_achievement(user_id, achievement_id):
-        return
-    ach = next((a for a in ACHIEVEMENTS if a["id"] == achievement_id), None)
-    if not ach:
-        return
-    achievement_collection.insert_one({
-        "user_id": user_id,
-        "achievement_id": achievement_id,
-        "unlocked_at": datetime.utcnow(),
-        "points": ach["points"]
-    })
-    user_collection.update_one(
+    return bool(unlock_many(user_id, [achievement_id]))
+
+# Dream-based rules, evaluated on the user's dream_stats document
+SILENT_READER_UNREAD = 3
+DREAM_STATS_RULES = {
+    "DREAM_BEGINS": lambda stats: stats["dreams"] >= 1,
+    "SILENT_READER": lambda stats: stats["unread"] >= SILENT_READER_UNREAD,
+    "STAYED_UP_LATE": lambda stats: bool(stats["late_night"]),
+    "GLITCH_GARDENER": lambda stats: bool(stats["glitch"]),
+    "MIST_DREAMER": lambda stats: bool(stats["misty"]),
+}
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        try:
+            achievement_collection.create_index([("user_id", 1), ("achievement_id", 1)], unique=True)
+        except OperationFailure as e:
+            # e.g. duplicate unlocks already stored, or an older non-unique index on the same keys.
+            # Without the index unlocks could be stored (and paid) twice, so nothing is unlocked
+            print("[Achievements] Unique (user_id, achievement_id) index not created, "
+                  "run python -m database.dedupe_achievements:", e)
+            raise
+        state_collection.create_index("user_id", unique=True)
+        _indexes_ready = True
+
+def get_state(user_id):
+    """
+    The user's evaluation state: {"unlocked": [...]}.
+    Bootstrapped from achievement_log the first time, and again for states
+    saved without the earlier unlocks (no `complete` flag).
+    """
+    state = state_collection.find_one({"user_id": user_id}, {"_id": 0})
+    if state is None or not state.get("complete"):
+        logged = [a["achievement_id"] for a in achievement_collection.find(
+            {"user_id": user_id}, {"_id": 0, "achievement_id": 1})]
+        state = {"user_id": user_id, "unlocked": sorted(set((state or {}).get("unlocked", [])) | set(logged))}
+    return state
+
+def evaluate_achievements(user_id, dreams=True, avatar=True):
+    """
+    Achievement check: rules already unlocked are skipped, and dream rules
+    read the user's dream_stats document instead of dream_logs.
+    `dreams` / `avatar` select which kind of activity to evaluate.
+    Returns the ids unlocked by this call.
+    """
+    ensure_indexes()
+    unlocked = set(get_state(user_id)["unlocked"])
+    newly = []
+
+    if dreams:
+        locked = [key for key in DREAM_STATS_RULES if key not in unlocked]
+        if locked:
+            stats = get_dream_stats(user_id)
+            newly += [key for key in locked if DREAM_STATS_RULES[key](stats)]
+
+    # AVATAR_MASTER (from user collection)
+    if avatar and "AVATAR_MASTER" not in unlocked:
+        user = user_collection.find_one({"user_id": user_id}, {"_id": 0, "avatar_count": 1})
+        if user and user.get("avatar_count", 0) >= 5:
+            newly.append("AVATAR_MASTER")
+
+    # PIXEL_COLLECTOR (unlocked animated ones ≥ 3)
+    if "PIXEL_COLLECTOR" not in unlocked and len((unlocked | set(newly)) & ANIMATED_IDS) >= 3:
+        newly.append("PIXEL_COLLECTOR")
+
+    unlock_many(user_id, newly)
+
+    # The full set, so a state bootstrapped from achievement_log keeps the earlier unlocks
+    state_collection.update_one(
         {"user_id": user_id},
-        {"$inc": {"achievement_points": ach["points"]}},
+        {"$addToSet": {"unlocked": {"$each": sorted(unlocked | set(newly))}},
+         "$set": {"complete": True, "updated_at": datetime.utcnow()}},
         upsert=True
     )
-    print(f"{user_id} unlocked: {ach['name']}")
+    return newly
 
 # Core checker logic
 def check_achievements(user_id):
-    dreams = list(dream_log_collection.find({"user_id": user_id}))
-    unread_count = sum(1 for d in dreams if d.get("read") is False)
-    
-    # DREAM_BEGINS
-    if len(dreams) >= 1:
-        unlock(user_id, "DREAM_BEGINS")
-
-    # SILENT_READER
-    if unread_count >= 3:
-        unlock(user_id, "SILENT_READER")
-
-    # STAYED_UP_LATE
-    for d in dreams:
-        ts = d.get("timestamp")
-        if isinstance(ts, datetime):
-            if time(1, 0) <= ts.time() <= time(4, 0):
-                unlock(user_id, "STAYED_UP_LATE")
-                break
-
-    # GLITCH_GARDENER
-    for d in dreams:
-        if d.get("sensor_status") == "invalid_fixed":
-            unlock(user_id, "GLITCH_GARDENER")
-            break
-
-    # MIST_DREAMER
-    if any(d.get("dream_type") == "misty" for d in dreams):
-        unlock(user_id, "MIST_DREAMER")
+    return evaluate_achievements(user_id)
 
-    # AVATAR_MASTER (from user collection)
-    user = user_collection.find_one({"user_id": user_id})
-    if user and user.get("avatar_count", 0) >= 5:
-        unlock(user_id, "AVATAR_MASTER")
+# Event hooks: only the rules the activity can affect are evaluated
+def on_dream_logged(user_id):
+    return evaluate_achievements(user_id, dreams=True, avatar=False)
 
-    # PIXEL_COLLECTOR (unlocked animated ones ≥ 3)
-    unlocked = list(achievement_collection.find({"user_id": user_id}))
-    animated_ids = [a["id"] for a in ACHIEVEMENTS if a["animate"]]
-    unlocked_animated = [u for u in unlocked if u["achievement_id"] in animated_ids]
-    if len(unlocked_animated) >= 3:
-        unlock(user_id, "PIXEL_COLLECTOR")
+def on_avatar_uploaded(user_id):
+    return evaluate_achievements(user_id, dreams=False, avatar=True)
+
+def reset_state(user_id):
+    """Forget the unlocked set (used when achievements are reset)."""
+    state_collection.delete_one({"user_id": user_id})
+
+
+# Benchmark against a user with many dreams (needs MONGODB_URI; writes and
+# removes a temporary "bench_dreams_*" user): python -m database.check_achievements [n_dreams]
+if __name__ == "__main__":
+    import sys
+    import time as timer
+    from datetime import timedelta
+
+    n_dreams = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    bench_user = f"bench_dreams_{n_dreams}"
+    start_ts = datetime(2025, 1, 1, 12)
+    dream_log_collection.delete_many({"user_id": bench_user})
+    achievement_collection.delete_many({"user_id": bench_user})
+    for offset in range(0, n_dreams, 10_000):
+        dream_log_collection.insert_many([
+            {"user_id": bench_user, "timestamp": start_ts + timedelta(hours=12 * i), "read": True,
+             "dream_type": "sunny", "dream_dialogue": "x" * 120}
+            for i in range(offset, min(offset + 10_000, n_dreams))
+        ])
+
+    try:
+        start = timer.perf_counter()
+        dreams = list(dream_log_collection.find({"user_id": bench_user}))
+        print(f"previous checker (load {len(dreams)} dreams): {timer.perf_counter() - start:.3f}s")
+
+        # Dreams were inserted directly, so the first check builds the dream_stats document
+        for label in ("first check (builds dream_stats, unlocks)", "repeat check"):
+            start = timer.perf_counter()
+            check_achievements(bench_user)
+            print(f"{label}: {timer.perf_counter() - start:.3f}s")
+    finally:
+        dream_log_collection.delete_many({"user_id": bench_user})
+        achievement_collection.delete_many({"user_id": bench_user})
+        user_collection.delete_many({"user_id": bench_user})
+        stats_collection.delete_one({"user_id": bench_user})
+        reset_state(bench_user)
@@ -10,7 +10,8 @@ Handles:
 - system notifications for users
 """
 
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
 from pathlib import Path
 import os
@@ -22,11 +23,22 @@ load_dotenv(dotenv_path=env_path)
 MONGO_URI = os.getenv("MONGODB_URI")
 
 # Connect to database
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["user_data"]
 plant_log_col = db["plant_log"]
 chat_col = db["neighbor_chat_log"]
 notif_col = db["notification_log"]
+# Unread notification counts per user ({"_id": user_id, "unread": {type: n}}),
+# so polling for the red dot is a primary-key read
+unread_col = db["notification_unread"]
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        notif_col.create_index([("user_id", 1), ("read", 1)])
+        _indexes_ready = True
 
 # Plant activity log 
 
@@ -72,7 +84,13 @@ def add_notification(user_id: str, message: str, notif_type: str = "info"):
         "read": False,
         "timestamp": datetime.now().isoformat()
     }
-    return notif_col.insert_one(notif).inserted_id
+    notif_id = notif_col.insert_one(notif).inserted_id
+    inc = {"$inc": {f"unread.{notif_type}": 1}}
+    if unread_col.update_one({"_id": user_id}, inc).matched_count == 0 and not seed_unread_counter(user_id):
+        # Seeded concurrently, possibly before this insert: count it (an
+        # over-count only keeps the red dot until the next read)
+        unread_col.update_one({"_id": user_id}, inc)
+    return notif_id
 
 def get_notifications(user_id: str):
     """
@@ -84,21 +102,70 @@ def mark_notifications_read(user_id: str):
     """
     Mark all unread notifications as read.
     """
+    # Counter first: a notification racing in between is then over-counted
+    # (red dot until the next read) rather than hidden
+    unread_col.update_one({"_id": user_id}, {"$set": {"unread": {}}})
     result = notif_col.update_many(
         {"user_id": user_id, "read": False},
         {"$set": {"read": True}}
     )
     return result.modified_count
+
 def count_unread_dreams(user_id: str):
     """
     Count how many unread dream-type notifications this user has.
     Used by frontend to decide whether to show a red dot.
+    Reads the user's counter document (see reconcile_unread_counts),
+    seeding it from notification_log if the user has none yet.
     """
-    return notif_col.count_documents({
-        "user_id": user_id,
-        "type": "dream",
-        "read": False
-    })
+    doc = unread_col.find_one({"_id": user_id}, {"unread.dream": 1})
+    if doc is None:
+        seed_unread_counter(user_id)
+        doc = unread_col.find_one({"_id": user_id}, {"unread.dream": 1})
+    return ((doc or {}).get("unread") or {}).get("dream", 0)
+
+def seed_unread_counter(user_id: str) -> bool:
+    """
+    Create a missing counter document from the user's unread notifications
+    (users whose notifications predate the counters). Returns False if the
+    document already existed, e.g. seeded concurrently.
+    """
+    ensure_indexes()
+    unread = {row["_id"]: row["n"] for row in notif_col.aggregate([
+        {"$match": {"user_id": user_id, "read": False}},
+        {"$group": {"_id": "$type", "n": {"$sum": 1}}}
+    ])}
+    try:
+        result = unread_col.update_one({"_id": user_id}, {"$setOnInsert": {"unread": unread}}, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return result.upserted_id is not None
+
+def reconcile_unread_counts(batch_size: int = 1000):
+    """
+    Recount unread notifications per user and type from notification_log
+    and overwrite the counters, repairing drift (e.g. a notification added
+    while the user's notifications were being marked read).
+    """
+    counts = {}
+    for row in notif_col.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": {"user_id": "$user_id", "type": "$type"}, "n": {"$sum": 1}}}
+    ], allowDiskUse=True):
+        counts.setdefault(row["_id"]["user_id"], {})[row["_id"]["type"]] = row["n"]
+
+    users = list(counts.items())
+    for start in range(0, len(users), batch_size):
+        unread_col.bulk_write([
+            UpdateOne({"_id": user_id}, {"$set": {"unread": unread}}, upsert=True)
+            for user_id, unread in users[start:start + batch_size]
+        ], ordered=False)
+
+    # Non-zero counters of users with nothing unread
+    stale = [doc["_id"] for doc in unread_col.find({"unread": {"$ne": {}}}, {"_id": 1}) if doc["_id"] not in counts]
+    for start in range(0, len(stale), batch_size):
+        unread_col.update_many({"_id": {"$in": stale[start:start + batch_size]}}, {"$set": {"unread": {}}})
+    return {"users": len(users), "cleared": len(stale)}
 
 plant_profile_col = db["plant_profile"]
 
@@ -108,3 +175,8 @@ def get_plant_owner(plant_id: str):
     """
     doc = plant_profile_col.find_one({"plant_id": plant_id})
     return doc["user_id"] if doc else None
+
+
+# Reconciliation job (cron): python -m database.community_db_manager
+if __name__ == "__main__":
+    print("[Notifications] Unread counters reconciled:", reconcile_unread_counts())
@@ -0,0 +1,99 @@
+"""
+Achievement Log Dedupe (migration)
+----------------------------------
+The unique (user_id, achievement_id) index on user_data.achievement_log is
+the only guard against unlocking (and paying for) an achievement twice, and
+it cannot be created while duplicates from the old check-then-insert race
+are stored. This migration:
+
+- groups achievement_log by (user_id, achievement_id) and keeps the earliest
+  unlock of every duplicated pair (oldest unlocked_at, then _id)
+- deletes the other copies and takes their points back from the user's
+  achievement_points (never below 0)
+- creates the unique index (check_achievements.ensure_indexes)
+
+Run once before deploying the bulk unlock code, and again if
+ensure_indexes reports duplicates:
+    python -m database.dedupe_achievements --dry-run   # report only
+    python -m database.dedupe_achievements
+
+Environment variables:
+- ACHIEVEMENT_DEDUPE_BATCH_SIZE: duplicate groups per bulk write (default 1000)
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from database.achievement_config import ACHIEVEMENTS_BY_ID
+from database.check_achievements import achievement_collection, ensure_indexes, user_collection
+
+BATCH_SIZE = int(os.getenv("ACHIEVEMENT_DEDUPE_BATCH_SIZE", "1000"))
+
+DUPLICATES_PIPELINE = [
+    {"$sort": {"unlocked_at": 1, "_id": 1}},
+    {"$group": {
+        "_id": {"user_id": "$user_id", "achievement_id": "$achievement_id"},
+        "entries": {"$push": {"_id": "$_id", "points": {"$ifNull": ["$points", None]}}},
+        "count": {"$sum": 1},
+    }},
+    {"$match": {"count": {"$gt": 1}}},
+]
+
+
+def _points(entry: Dict, achievement_id: str) -> int:
+    if entry.get("points") is not None:
+        return entry["points"]
+    return ACHIEVEMENTS_BY_ID.get(achievement_id, {}).get("points", 0)
+
+
+def _apply(removed_ids: List, refunds: Dict[str, int]):
+    achievement_collection.delete_many({"_id": {"$in": removed_ids}})
+    if refunds:
+        user_collection.bulk_write([UpdateOne({"user_id": user_id}, [{"$set": {"achievement_points": {
+            "$max": [0, {"$subtract": [{"$ifNull": ["$achievement_points", 0]}, points]}]}}}])
+            for user_id, points in refunds.items()], ordered=False)
+
+
+def dedupe_achievements(batch_size: int = BATCH_SIZE, dry_run: bool = False) -> Dict:
+    """Remove duplicate unlocks, take back their points, create the unique index. Returns counters."""
+    start = time.perf_counter()
+    stats = {"pairs": 0, "removed": 0, "points": 0, "users": 0}
+    users = set()
+
+    removed_ids, refunds = [], {}
+    for group in achievement_collection.aggregate(DUPLICATES_PIPELINE, allowDiskUse=True):
+        user_id, achievement_id = group["_id"]["user_id"], group["_id"]["achievement_id"]
+        extra = group["entries"][1:]  # the first entry is the earliest unlock
+        points = sum(_points(entry, achievement_id) for entry in extra)
+        stats["pairs"] += 1
+        stats["removed"] += len(extra)
+        stats["points"] += points
+        users.add(user_id)
+
+        removed_ids += [entry["_id"] for entry in extra]
+        if points:
+            refunds[user_id] = refunds.get(user_id, 0) + points
+        if len(removed_ids) >= batch_size and not dry_run:
+            _apply(removed_ids, refunds)
+            removed_ids, refunds = [], {}
+    if removed_ids and not dry_run:
+        _apply(removed_ids, refunds)
+
+    stats["users"] = len(users)
+    if not dry_run:
+        ensure_indexes()
+        stats["index"] = "created"
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove duplicate achievement unlocks and create the unique index.")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    print("[Achievement Dedupe]", dedupe_achievements(args.batch_size, args.dry_run))
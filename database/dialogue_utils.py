@@ -24,7 +24,6 @@ from pathlib import Path
 from datetime import timedelta
 from typing import Dict, Tuple
 
-import pandas as pd
 import pytz
 
 # Config and initialization
@@ -45,6 +44,8 @@ def _period_key(row: dict) -> str:
     
     Records before 06:00 local time belong to previous day's period.
     """
+    import pandas as pd  # deferred: pandas adds ~0.5s to API startup
+
     ts_local = (
         pd.to_datetime(row["timestamp"])
         .tz_localize("UTC")
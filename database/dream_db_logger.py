@@ -8,11 +8,14 @@ Updates existing records if dream_stamp_id matches, otherwise inserts new ones.
 """
 
 import json
-from pymongo import MongoClient
+from bson import ObjectId
+from pymongo import MongoClient, ReturnDocument
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+from database.check_achievements import on_dream_logged
+from database.dream_stats import record_dream_write
 
 # Load MongoDB credentials from local .env_user file
 env_path = Path(__file__).parent / ".env_user"
@@ -20,7 +23,7 @@ load_dotenv(dotenv_path=env_path)
 
 # connect to MongoDB
 MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["GrowAI"]
 collection = db["dream_logs"]
 
@@ -37,15 +40,23 @@ for record in dream_data:
         except Exception:
             pass
 
-    result = collection.update_one(
+    # The previous version of the dream (None if inserted) keeps dream_stats in step
+    new_id = ObjectId()
+    before = collection.find_one_and_update(
         {"dream_stamp_id": record["dream_stamp_id"]},
-        {"$set": record},
-        upsert=True
+        {"$set": record, "$setOnInsert": {"_id": new_id}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
     )
+    record_dream_write(before, {**(before or {"_id": new_id}), **record})
 
-    if result.matched_count:
+    if before is not None:
         print(f"Updated: {record['dream_stamp_id']}")
     else:
         print(f"Inserted: {record['dream_stamp_id']}")
 
 print("Done writing dream logs to MongoDB.")
+
+# Achievements for users with new dreams (read from their dream_stats documents)
+for user_id in sorted({record["user_id"] for record in dream_data if record.get("user_id")}):
+    on_dream_logged(user_id)
@@ -1,15 +1,14 @@
 from fastapi import APIRouter, UploadFile, File, Form, Path
-from fastapi.responses import JSONResponse
-from typing import Dict
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List
 from io import BytesIO
 from PIL import Image
-import torch
-import torchvision.transforms as transforms
-from torchvision.models import resnet18
 import sys
 import os
 import numpy as np
 from datetime import datetime, timedelta
+import asyncio
 
 
 # Import score computation and environment bonus logic
@@ -17,77 +16,27 @@ from leaf.scoring.health_score import calculate_health_score
 from leaf.scoring.env_bonus import calculate_environment_bonus
 from leaf.predictor.watering_model import predict_watering_days
 from database.user_db_manager import get_user
-from leaf.weather_module import should_delay_watering
-
-
-MODEL_PATH = os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "..", "leaf", "leaf_classifier_final_augmented.pth")
+from database.watering_schedule import (
+    apply_weather_delay, compute_schedule, get_watering_schedule, save_schedule, user_cell
 )
-# Initialize FastAPI router
-router = APIRouter(prefix="/leaf", tags=["Leaf Scan"])
+from leaf.weather_module import weather_client
+from leaf.lazy_pipeline import LazyScanPipeline
+from leaf.scan_batch import build_batch_items, stream_scan_results
 
-from torchvision import models
 
-# Initialize ResNet18 model (no pretrained weights)
-model = resnet18(weights=None)
-model.fc = torch.nn.Linear(model.fc.in_features, 2)
+# Latency budgets; the weather lookup gets whatever is left when it runs
+SCAN_BUDGET_SECONDS = float(os.getenv("LEAF_SCAN_BUDGET_MS", "3000")) / 1000
+NEXT_WATERING_BUDGET_SECONDS = float(os.getenv("LEAF_NEXT_WATERING_BUDGET_MS", "1000")) / 1000
 
+# Initialize FastAPI router
+router = APIRouter(prefix="/leaf", tags=["Leaf Scan"])
 
-# Adjust the final layer for 2-class classification
-model.fc = torch.nn.Linear(model.fc.in_features, 2)
-
-# Load the state_dict (weights only)
-state_dict = torch.load(MODEL_PATH, map_location=torch.device("cpu"))
-model.load_state_dict(state_dict)
-
-# Set to evaluation mode
-model.eval()
-
+# Cached image analysis: decode/preprocess in a dedicated pool, off the event loop,
+# and micro-batched forward passes shared by concurrent scans.
+# Built on the first scan (or warmup) so importing this module stays fast.
+pipeline = LazyScanPipeline()
 
-# Define image preprocessing pipeline (must match training)
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std=[0.229, 0.224, 0.225])
-])
 
-# Index-to-label mapping (based on training classes)
-idx_to_label = {
-    0: "healthy",
-    1: "wilted"
-}
-def extract_leaf_features(img: Image.Image) -> dict:
-    """
-    Analyze leaf image and extract basic visual features.
-    Returns features in the format required by calculate_leaf_score.
-    """
-    np_img = np.array(img)
-
-    # Convert to HSV for better color segmentation
-    hsv = np.array(img.convert("HSV"))
-
-    # --- Color Features ---
-    yellow_mask = ((hsv[:, :, 0] >= 20) & (hsv[:, :, 0] <= 40)) & (hsv[:, :, 1] > 50)
-    brown_mask = ((hsv[:, :, 0] >= 10) & (hsv[:, :, 0] <= 20)) & (hsv[:, :, 1] > 30)
-
-    yellow_ratio = yellow_mask.sum() / (np_img.shape[0] * np_img.shape[1])
-    brown_pixels = brown_mask.sum()
-
-    # --- Shape Features (dummy logic, improve later) ---
-    irregularity = 0.3  # Fixed for now
-    holes_detected = False  # Not implemented yet
-
-    return {
-        "color": {
-            "yellow_ratio": round(float(yellow_ratio), 2),
-            "brown": int(brown_pixels)
-        },
-        "shape": {
-            "irregularity": irregularity,
-            "holes_detected": holes_detected
-        }
-    }
 @router.post("/scan", summary="Scan Leaf Health", description="Upload a leaf image and optional environment data to analyze plant health.")
 async def scan_leaf(
     image: UploadFile = File(..., description="Leaf image (.jpg/.png)"),
@@ -117,32 +66,27 @@ Returns (JSON):
     - env_bonus (int): Environmental adjustment (range: –10 to +10)
 """
 
+    deadline = asyncio.get_running_loop().time() + SCAN_BUDGET_SECONDS
     try:
-        # 1. Read and open image
+        # 1. Read image
         contents = await image.read()
-        img = Image.open(BytesIO(contents)).convert("RGB")
 
-        # 2. Preprocess and predict with model
-        input_tensor = transform(img).unsqueeze(0)
-        with torch.no_grad():
-            output = model(input_tensor)
-            probs = torch.nn.functional.softmax(output[0], dim=0)
-            confidence, pred_idx = torch.max(probs, dim=0)
-            label = idx_to_label[int(pred_idx)]
+        # 2. Predict with model + extract leaf features (cached per image and model version)
+        analysis = await pipeline.analyze(contents)
+        label = analysis["label"]
+        leaf_features = analysis["leaf_features"]
 
         # 3. Score environment based on inputs
         env_bonus, env_comments = calculate_environment_bonus(soil_moisture, light_level)
 
         # 4. Compute final health score and suggestions
-        leaf_features = extract_leaf_features(img)
-
         result = calculate_health_score(
             leaf_features=leaf_features,
             soil_moisture=soil_moisture,
             light_level=light_level
         )
         # 5. Predict watering interval using the trained model
-        watering_days = predict_watering_days(light_level, soil_moisture)
+        watering_days = await run_in_threadpool(predict_watering_days, light_level, soil_moisture)
         # Adjust watering_days based on plant-level needs
         def adjust_by_plant_needs(user_id: str, watering_days: int) -> tuple[int, str]:
             user = get_user(user_id)
@@ -167,20 +111,18 @@ Returns (JSON):
             return watering_days, style_note
 
 
-        watering_days, style_note = adjust_by_plant_needs(user_id, watering_days)
+        watering_days, style_note = await run_in_threadpool(adjust_by_plant_needs, user_id, watering_days)
         result["watering_days"] = watering_days
         result["suggestion"] = f"Suggested watering interval: every {watering_days} day(s)"
-        # 5.5 Optional: Delay watering due to upcoming rain
-        from leaf.weather_module import should_delay_watering
-
-        user = get_user(user_id)
+        # 5.5 Optional: Delay watering due to upcoming rain (skipped past the route's latency budget)
+        user = await run_in_threadpool(get_user, user_id)
         weather_note = ""
         if user and "location" in user:
             coords = user["location"]
             lat = coords.get("lat")
             lon = coords.get("lon")
             if lat is not None and lon is not None:
-                delay_due_to_weather = should_delay_watering(lat, lon)
+                delay_due_to_weather = await weather_client.should_delay_watering(lat, lon, deadline)
                 if delay_due_to_weather:
                     watering_days += 1
                     weather_note = "Rain is expected soon. Watering has been delayed by one day."
@@ -204,6 +146,7 @@ Returns (JSON):
         result.pop("suggestion", None)
         result.pop("watering_days", None)
         result["label"] = label
+        result["model_version"] = analysis["model_version"]
 
         return result
 
@@ -214,57 +157,87 @@ Returns (JSON):
 async def get_next_watering(user_id: str):
     """
     Returns the estimated next watering date for a user, considering environment and plant preference.
+    Served from the materialized watering_schedule collection; recomputed for this user when needed.
     """
 
+    deadline = asyncio.get_running_loop().time() + NEXT_WATERING_BUDGET_SECONDS
     try:
-        user = get_user(user_id)
-        if not user:
-            return JSONResponse(status_code=404, content={"error": "User not found."})
-
+        # Normally today's precomputed document (see database/watering_schedule.py)
+        schedule = await run_in_threadpool(get_watering_schedule, user_id)
+
+        if schedule is None:
+            # Missing, computed on an earlier day, or the user's plants/location changed
+            user = await run_in_threadpool(get_user, user_id)
+            if not user:
+                return JSONResponse(status_code=404, content={"error": "User not found."})
+
+            delays = {}
+            cell = user_cell(user)
+            if cell is not None:
+                coords = user["location"]
+                delays[cell] = bool(await weather_client.should_delay_watering(coords["lat"], coords["lon"], deadline))
+
+            schedule = (await run_in_threadpool(compute_schedule, [user], delays))[0]
+            await run_in_threadpool(save_schedule, [schedule])
+        elif schedule.get("cell") is not None:
+            # The stored interval has no weather: add today's current rain delay
+            lat, lon = schedule["cell"]
+            delayed = bool(await weather_client.should_delay_watering(lat, lon, deadline))
+            schedule = apply_weather_delay(schedule, delayed)
 
-        light_level = 50.0
-        soil_moisture = 50.0
-
-
-        watering_days = predict_watering_days(light_level, soil_moisture)
-
-        def adjust_by_plant_needs(user_id: str, watering_days: int) -> tuple[int, str]:
-            user = get_user(user_id)
-            plants = user.get("plants", []) if user else []
-            frequent = sum(p.get("needs_frequent_water", False) for p in plants)
-            total = len(plants)
-            style_note = ""
-
-            if total == 0:
-                return watering_days, style_note
+        return {
+            "user_id": user_id,
+            "predicted_next_watering_date": schedule["predicted_next_watering_date"],
+            "days_until_next_watering": schedule["days_until_next_watering"]
+        }
 
-            ratio = frequent / total
-            if ratio >= 0.6:
-                watering_days = max(1, watering_days - 1)
-            elif ratio <= 0.4:
-                watering_days += 1
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
 
-            return watering_days, style_note
 
-        watering_days, _ = adjust_by_plant_needs(user_id, watering_days)
+@router.post("/scan_batch", summary="Batch Scan Leaf Health", description="Upload many leaf images (or a .zip/.tar of them) and stream one health report per image as NDJSON.")
+async def scan_leaf_batch(
+    images: List[UploadFile] = File(..., description="Leaf images (.jpg/.png) and/or .zip/.tar archives of them"),
+    light_level: List[float] = Form([], description="Light level per image, in upload order (default 50)"),
+    soil_moisture: List[float] = Form([], description="Soil moisture per image, in upload order (default 50)"),
+    metadata: str = Form(None, description='Optional JSON {"filename": {"light_level": .., "soil_moisture": ..}}')
+):
+    """
+    Batch version of /leaf/scan for greenhouse sessions.
 
-        from leaf.weather_module import should_delay_watering
-        if "location" in user:
-            coords = user["location"]
-            lat = coords.get("lat")
-            lon = coords.get("lon")
-            if lat is not None and lon is not None:
-                delay_due_to_weather = should_delay_watering(lat, lon)
-                if delay_due_to_weather:
-                    watering_days += 1
+    All images are analysed concurrently through the shared scan pipeline, so
+    the batching engine runs them as full forward-pass batches. The response
+    streams one JSON line per image as soon as it is ready (completion order):
+    the calculate_health_score report plus `index` (position after archive
+    expansion) and `filename`, or `index`, `filename` and `error`.
+    """
+    try:
+        uploads = [(upload.filename, await upload.read()) for upload in images]
+        items = await run_in_threadpool(build_batch_items, uploads, light_level, soil_moisture, metadata)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
-        next_date = datetime.today() + timedelta(days=watering_days)
+    return StreamingResponse(stream_scan_results(pipeline, items), media_type="application/x-ndjson")
 
-        return {
-            "user_id": user_id,
-            "predicted_next_watering_date": next_date.strftime("%Y-%m-%d"),
-            "days_until_next_watering": watering_days
-        }
 
+@router.post("/reload", summary="Reload Leaf Model")
+async def reload_leaf_model():
+    """
+    Start loading the model registry's active version in the background and
+    return 202 with the target version; the model is swapped in once warm.
+    Requests already running finish on the previous model. Progress and
+    errors are reported by /leaf/metrics.
+    """
+    try:
+        return JSONResponse(status_code=202, content=await run_in_threadpool(pipeline.start_reload))
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/metrics", summary="Leaf Inference Metrics")
+def get_inference_metrics():
+    """
+    Report inference executor concurrency limits/usage, micro-batching counters,
+    scan cache statistics and weather client counters.
+    """
+    return {**pipeline.metrics(), "weather": weather_client.metrics()}
@@ -1,3 +1,6 @@
+import os
+import time
+
 from fastapi import FastAPI, File, Form, UploadFile
 
 from database.achievement_api import app as achievement_app, get_achievement_progress, check_and_draw_lottery
@@ -6,7 +9,17 @@ from database.community_db_manager import count_unread_dreams
 from database.check_achievements import check_achievements
 from database.dream_chat_api import app as chat_app
 from database.plant_log_api import router as plant_log_router
-from database.leaf_api import router as leaf_router
+from database.leaf_api import router as leaf_router, pipeline as leaf_pipeline
+from leaf.predictor.watering_model import get_watering_model
+from leaf.weather_module import ForecastRefresher, weather_client
+from database.user_db_manager import list_user_locations
+
+# Heavy libraries and models load on first use unless LAZY_STARTUP=0
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") != "0"
+
+# Prefetch weather forecasts for all users' locations (0 disables)
+WEATHER_REFRESH_SECONDS = float(os.getenv("WEATHER_REFRESH_SECONDS", "600"))
+weather_refresher = ForecastRefresher(list_user_locations, WEATHER_REFRESH_SECONDS)
 
 app = FastAPI()
 app.include_router(plant_log_router)
@@ -16,6 +29,33 @@ app.mount("/achievement", achievement_app)
 app.mount("/avatar", avatar_app)
 app.mount("/chat", chat_app)
 
+def warmup() -> dict:
+    """Import heavy libraries and load models now instead of on the first request."""
+    timings = {}
+    for name, load in [("scan_pipeline", leaf_pipeline.warmup),
+                       ("watering_model", get_watering_model),
+                       ("pandas", lambda: __import__("pandas"))]:
+        start = time.perf_counter()
+        load()
+        timings[name] = round(time.perf_counter() - start, 3)
+    return timings
+
+@app.on_event("startup")
+def eager_startup():
+    if not LAZY_STARTUP:
+        print("[Startup] Warmup:", warmup())
+    if WEATHER_REFRESH_SECONDS > 0:
+        weather_refresher.start()
+
+@app.on_event("shutdown")
+async def close_weather_client():
+    weather_refresher.stop()
+    await weather_client.close()
+
+@app.post("/warmup")
+def warmup_route():
+    return {"status": "warm", "seconds": warmup()}
+
 @app.get("/")
 def root():
     return {"message": "Grow AI backend is running + all routes included"}
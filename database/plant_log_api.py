@@ -5,7 +5,7 @@ from datetime import datetime
 
 router = APIRouter()
 
-client = MongoClient(os.getenv("MONGODB_URI"))
+client = MongoClient(os.getenv("MONGODB_URI"), connect=False)
 db = client["user_data"]
 dream_logs = db["plant_log"]
 
@@ -0,0 +1,83 @@
+"""
+Startup Import-Time Profile
+---------------------------
+Imports the API entry point in a fresh interpreter with `python -X importtime`
+and reports total import time, the slowest modules and whether any heavy
+library (torch, pandas, scikit-learn, ...) was pulled in at import time.
+
+Usage (from the project root):
+    python -m database.startup_profile                 # profiles database.main
+    python -m database.startup_profile main --top 30   # flat deploy layout
+
+Heavy libraries should only load on first use or via POST /warmup
+(LAZY_STARTUP=0 restores eager loading at server startup).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Libraries that must not be imported just by importing main.py
+HEAVY_MODULES = ("torch", "torchvision", "pandas", "sklearn", "joblib")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy_modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def profile_import(module: str = "database.main", top: int = 15) -> Dict:
+    """
+    Import `module` in a subprocess and return:
+        seconds:       wall time of the import statement
+        heavy_modules: HEAVY_MODULES present in sys.modules afterwards
+        slowest:       [{module, self_ms, cumulative_ms}] by cumulative time
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["module"] = module
+    result["slowest"] = _parse_importtime(completed.stderr)[:top]
+    return result
+
+
+def _parse_importtime(stderr: str) -> List[Dict]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "self_ms": round(int(self_us) / 1000, 1),
+            "cumulative_ms": round(int(cumulative_us) / 1000, 1)
+        })
+    return sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import-time profile of the API entry point.")
+    parser.add_argument("module", nargs="?", default="database.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    profile = profile_import(args.module, args.top)
+    print(f"import {profile['module']}: {profile['seconds']:.3f} s")
+    print(f"heavy modules loaded: {', '.join(profile['heavy_modules']) or 'none'}")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in profile["slowest"]:
+        print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
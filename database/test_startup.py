@@ -0,0 +1,28 @@
+"""
+Startup budget regression test.
+
+Importing the API must stay cheap: no torch / pandas / scikit-learn at import
+time and a bounded wall time. Run from the project root:
+    python -m pytest database/test_startup.py
+
+STARTUP_BUDGET_SECONDS overrides the time budget (e.g. on slow CI machines).
+"""
+
+import os
+
+from database.startup_profile import profile_import
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+
+
+def test_main_import_defers_heavy_modules():
+    profile = profile_import("database.main")
+    assert profile["heavy_modules"] == [], f"Imported at startup: {profile['heavy_modules']}"
+
+
+def test_main_import_within_budget():
+    profile = profile_import("database.main")
+    assert profile["seconds"] <= STARTUP_BUDGET_SECONDS, (
+        f"import database.main took {profile['seconds']:.2f}s "
+        f"(budget {STARTUP_BUDGET_SECONDS}s); slowest: {profile['slowest'][:5]}"
+    )
@@ -0,0 +1,110 @@
+"""
+Parity tests: materialized watering schedule vs the old per-request rules of
+/leaf/next_watering (model interval, plant-ratio adjustment, weather delay).
+
+Run from the project root:
+    python -m pytest database/test_watering_schedule.py
+"""
+
+from datetime import datetime, timedelta
+
+from database.watering_schedule import (
+    DEFAULT_LIGHT_LEVEL, DEFAULT_SOIL_MOISTURE, apply_weather_delay, compute_schedule, user_cell
+)
+from leaf.predictor.watering_model import predict_watering_days
+
+TODAY = datetime(2025, 6, 1)
+LONDON = {"lat": 51.5074, "lon": -0.1278}
+
+
+def _old_next_watering(user, delayed):
+    """The route's computation before the schedule was materialized."""
+    watering_days = predict_watering_days(DEFAULT_LIGHT_LEVEL, DEFAULT_SOIL_MOISTURE)
+
+    plants = user.get("plants", [])
+    frequent = sum(p.get("needs_frequent_water", False) for p in plants)
+    total = len(plants)
+    if total:
+        ratio = frequent / total
+        if ratio >= 0.6:
+            watering_days = max(1, watering_days - 1)
+        elif ratio <= 0.4:
+            watering_days += 1
+
+    location = user.get("location", {})
+    if location.get("lat") is not None and location.get("lon") is not None and delayed:
+        watering_days += 1
+
+    next_date = TODAY + timedelta(days=watering_days)
+    return next_date.strftime("%Y-%m-%d"), watering_days
+
+
+def _plants(frequent, total):
+    return [{"needs_frequent_water": i < frequent} for i in range(total)]
+
+
+def _users():
+    users = []
+    for frequent, total in [(0, 0), (0, 3), (1, 3), (2, 5), (1, 2), (3, 5), (2, 3), (4, 4)]:
+        users.append({"user_id": f"ratio-{frequent}-{total}", "plants": _plants(frequent, total)})
+    users.append({"user_id": "no-plants-key"})
+    users.append({"user_id": "rain", "plants": _plants(1, 4), "location": LONDON})
+    users.append({"user_id": "rain-frequent", "plants": _plants(4, 4), "location": LONDON})
+    users.append({"user_id": "dry", "plants": _plants(2, 4), "location": {"lat": 40.0, "lon": -3.7}})
+    users.append({"user_id": "partial-location", "plants": _plants(1, 4), "location": {"lat": 51.5}})
+    return users
+
+
+def test_schedule_matches_old_route_rules():
+    users = _users()
+    delays = {user_cell({"location": LONDON}): True, user_cell({"location": {"lat": 40.0, "lon": -3.7}}): False}
+
+    docs = compute_schedule(users, delays, TODAY)
+
+    for user, doc in zip(users, docs):
+        cell = user_cell(user)
+        expected_date, expected_days = _old_next_watering(user, cell is not None and delays.get(cell, False))
+        assert doc["user_id"] == user["user_id"]
+        assert doc["days_until_next_watering"] == expected_days, user["user_id"]
+        assert doc["predicted_next_watering_date"] == expected_date, user["user_id"]
+        assert doc["computed_on"] == "2025-06-01"
+        assert doc["stale"] is False
+
+
+def test_weather_delay_adds_one_day():
+    user = {"user_id": "u", "plants": _plants(1, 2), "location": LONDON}
+    cell = user_cell(user)
+
+    dry = compute_schedule([user], {cell: False}, TODAY)[0]
+    wet = compute_schedule([user], {cell: True}, TODAY)[0]
+
+    assert wet["days_until_next_watering"] == dry["days_until_next_watering"] + 1
+    assert wet["weather_delayed"] and not dry["weather_delayed"]
+
+
+def test_weather_delay_is_applied_on_read():
+    user = {"user_id": "u", "plants": _plants(1, 2), "location": LONDON}
+    cell = user_cell(user)
+
+    dry = compute_schedule([user], {cell: False}, TODAY)[0]
+    wet = compute_schedule([user], {cell: True}, TODAY)[0]
+
+    # The forecast changed after the document was computed
+    assert apply_weather_delay(wet, False, TODAY) == {**dry, "computed_at": wet["computed_at"]}
+    assert apply_weather_delay(dry, True, TODAY) == {**wet, "computed_at": dry["computed_at"]}
+    assert tuple(wet["cell"]) == cell and wet["base_days"] == dry["base_days"]
+
+
+def test_no_plants_keeps_model_interval():
+    doc = compute_schedule([{"user_id": "u", "plants": []}], {}, TODAY)[0]
+
+    assert doc["days_until_next_watering"] == predict_watering_days(DEFAULT_LIGHT_LEVEL, DEFAULT_SOIL_MOISTURE)
+    assert doc["weather_delayed"] is False
+
+
+if __name__ == "__main__":
+    test_schedule_matches_old_route_rules()
+    test_weather_delay_adds_one_day()
+    test_weather_delay_is_applied_on_read()
+    test_no_plants_keeps_model_interval()
+    print("All watering schedule parity tests passed.")
@@ -23,9 +23,14 @@ load_dotenv(dotenv_path=env_path)
 
 # Establish connection
 MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["user_data"]
 collection = db["users"]
+# Materialized next-watering dates (see watering_schedule.py), one document per user
+schedule_collection = db["watering_schedule"]
+
+# Changing these fields changes the user's watering schedule
+SCHEDULE_FIELDS = ("plants", "location")
 
 def add_user(user_data: dict):
     """Insert a new user document into the collection."""
@@ -39,16 +44,27 @@ def get_user(user_id: str):
 def update_user(user_id: str, updates: dict):
     """Update fields in a user profile using partial field updates."""
     result = collection.update_one({"user_id": user_id}, {"$set": updates})
+    if result.modified_count and any(key.split(".")[0] in SCHEDULE_FIELDS for key in updates):
+        mark_schedule_stale(user_id)
     return result.modified_count
 
 def delete_user(user_id: str):
     """Delete a user profile permanently from the database."""
     result = collection.delete_one({"user_id": user_id})
+    schedule_collection.delete_one({"user_id": user_id})
     return result.deleted_count
 
+def mark_schedule_stale(user_id: str):
+    """Make the next /leaf/next_watering read recompute this user's schedule."""
+    schedule_collection.update_one({"user_id": user_id}, {"$set": {"stale": True}})
+
 def list_users():
     """Return a list of all user profiles without MongoDB _id field."""
     return list(collection.find({}, {"_id": 0}))
+def list_user_locations():
+    """Return the `location` ({lat, lon}) of every user that has one."""
+    return [user["location"] for user in collection.find({"location": {"$exists": True}}, {"_id": 0, "location": 1})]
+
 def get_user_plants(user_id: str):
     """Return a list of all plant profiles owned by a user."""
     user = collection.find_one({"user_id": user_id}, {"_id": 0, "plants": 1})
@@ -0,0 +1,223 @@
+"""
+Materialized Watering Schedule
+------------------------------
+`/leaf/next_watering/{user_id}` used to predict the interval, read the user
+twice, apply the plant-preference adjustment and call the weather API on every
+request. This module precomputes the answer for every user into the
+`watering_schedule` collection (unique index on `user_id`), so the route is a
+single indexed read.
+
+The nightly job streams users from `users` with a cursor, computes each
+chunk's intervals in one vectorized model call, looks weather up once per
+forecast grid cell and upserts the chunk with one `bulk_write`:
+
+    python -m database.watering_schedule               # all users (cron, nightly)
+    python -m database.watering_schedule --stale-only  # only changed users
+
+--stale-only streams the stale / outdated schedule documents, then anti-joins
+the users cursor chunk by chunk to find users without one.
+
+A schedule is recomputed on read when it is missing, was computed on an
+earlier day, or was marked stale by `update_user` changing the user's
+`plants` or `location`. Code that writes `plants` or `location` without
+`update_user` must call `mark_schedule_stale`, otherwise the change shows up
+with the next nightly run.
+
+The rain delay is not fixed into the document: it stores the interval
+without weather (`base_days`) and the user's grid `cell`, and the route adds
+the delay from the cell's current (cached) forecast on every read, so a
+forecast change later in the day is picked up. `days_until_next_watering` and
+`weather_delayed` in the stored document are a snapshot from compute time.
+
+Environment variables:
+- WATERING_SCHEDULE_BATCH_SIZE: users per cursor batch / bulk write (default 1000)
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from database.user_db_manager import collection as user_collection, schedule_collection
+from leaf.predictor.watering_model import predict_watering_days_batch
+from leaf.weather_module import delay_message, get_forecast, grid_cell
+
+BATCH_SIZE = int(os.getenv("WATERING_SCHEDULE_BATCH_SIZE", "1000"))
+
+# The route has no sensor readings, so it predicts for these defaults
+DEFAULT_LIGHT_LEVEL = 50.0
+DEFAULT_SOIL_MOISTURE = 50.0
+
+USER_PROJECTION = {"_id": 0, "user_id": 1, "location": 1, "plants.needs_frequent_water": 1}
+
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        schedule_collection.create_index("user_id", unique=True)
+        _indexes_ready = True
+
+
+def user_cell(user: Dict) -> Optional[Tuple[float, float]]:
+    """Forecast grid cell of the user's location, or None without one."""
+    location = user.get("location") or {}
+    if location.get("lat") is None or location.get("lon") is None:
+        return None
+    return grid_cell(location["lat"], location["lon"])
+
+
+def weather_delays(cells: Iterable[Tuple[float, float]]) -> Dict[Tuple[float, float], bool]:
+    """Rain delay per grid cell, one (cached) forecast lookup per cell."""
+    delays = {}
+    for cell in cells:
+        try:
+            delays[cell] = delay_message(get_forecast(*cell)) != ""
+        except Exception as e:
+            print(f"[Watering Schedule] Weather for cell {cell} failed:", e)
+            delays[cell] = False
+    return delays
+
+
+def compute_schedule(users: List[Dict], delays: Dict[Tuple[float, float], bool], today: datetime = None) -> List[Dict]:
+    """
+    Next-watering documents for a chunk of users, with the same rules as the
+    route: model interval, -1 day (min 1) if >= 60% of plants need frequent
+    water, +1 if <= 40% do, +1 if rain is expected in the user's cell.
+    """
+    today = today or datetime.today()
+    n = len(users)
+    days = predict_watering_days_batch(np.full(n, DEFAULT_LIGHT_LEVEL), np.full(n, DEFAULT_SOIL_MOISTURE))
+
+    total = np.array([len(user.get("plants", [])) for user in users])
+    frequent = np.array([sum(bool(p.get("needs_frequent_water", False)) for p in user.get("plants", []))
+                         for user in users])
+    ratio = np.divide(frequent, total, out=np.full(n, 0.5), where=total > 0)
+    days = np.where(ratio >= 0.6, np.maximum(1, days - 1), np.where(ratio <= 0.4, days + 1, days))
+
+    cells = [user_cell(user) for user in users]
+    delayed = np.array([cell is not None and delays.get(cell, False) for cell in cells], dtype=bool)
+
+    computed_on = today.strftime("%Y-%m-%d")
+    computed_at = datetime.utcnow()
+    return [apply_weather_delay({
+        "user_id": user["user_id"],
+        "base_days": int(d),
+        "cell": list(cell) if cell is not None else None,
+        "computed_on": computed_on,
+        "computed_at": computed_at,
+        "stale": False,
+    }, bool(delay), today) for user, d, cell, delay in zip(users, days, cells, delayed)]
+
+
+def apply_weather_delay(doc: Dict, delayed: bool, today: datetime = None) -> Dict:
+    """The schedule document with the rain delay (+1 day if `delayed`) applied to `base_days`."""
+    today = today or datetime.today()
+    days = doc["base_days"] + int(delayed)
+    return {
+        **doc,
+        "predicted_next_watering_date": (today + timedelta(days=days)).strftime("%Y-%m-%d"),
+        "days_until_next_watering": days,
+        "weather_delayed": delayed,
+    }
+
+
+def save_schedule(docs: List[Dict]) -> int:
+    """Upsert schedule documents in one unordered bulk write."""
+    if not docs:
+        return 0
+    ensure_indexes()
+    result = schedule_collection.bulk_write(
+        [UpdateOne({"user_id": doc["user_id"]}, {"$set": doc}, upsert=True) for doc in docs],
+        ordered=False,
+    )
+    return result.upserted_count + result.modified_count
+
+
+def get_watering_schedule(user_id: str, today: datetime = None) -> Optional[Dict]:
+    """Today's materialized schedule for the user, or None if it must be recomputed."""
+    computed_on = (today or datetime.today()).strftime("%Y-%m-%d")
+    doc = schedule_collection.find_one({"user_id": user_id}, {"_id": 0, "computed_at": 0})
+    if doc is None or doc.get("stale") or doc.get("computed_on") != computed_on or "base_days" not in doc:
+        return None
+    return doc
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _stale_user_chunks(computed_on: str, batch_size: int) -> Iterator[List[Dict]]:
+    """
+    Chunks of users whose schedule is stale, from an earlier day or missing,
+    without holding more than one chunk of ids in memory:
+    - a cursor over stale / outdated schedule documents, users fetched per chunk
+    - a cursor over users, each chunk anti-joined with watering_schedule
+    """
+    outdated = schedule_collection.find(
+        {"$or": [{"stale": True}, {"computed_on": {"$ne": computed_on}}]},
+        {"_id": 0, "user_id": 1}, batch_size=batch_size)
+    for docs in _chunks(outdated, batch_size):
+        user_ids = [doc["user_id"] for doc in docs]
+        users = list(user_collection.find({"user_id": {"$in": user_ids}}, USER_PROJECTION))
+        if users:
+            yield users
+
+    users = user_collection.find({"user_id": {"$exists": True}}, USER_PROJECTION, batch_size=batch_size)
+    for chunk in _chunks(users, batch_size):
+        scheduled = {doc["user_id"] for doc in schedule_collection.find(
+            {"user_id": {"$in": [user["user_id"] for user in chunk]}}, {"_id": 0, "user_id": 1})}
+        missing = [user for user in chunk if user["user_id"] not in scheduled]
+        if missing:
+            yield missing
+
+
+def rebuild_watering_schedule(batch_size: int = BATCH_SIZE, stale_only: bool = False) -> Dict:
+    """Recompute schedules for all users (or only stale/missing ones). Returns counters."""
+    start = time.perf_counter()
+    ensure_indexes()
+    today = datetime.today()
+
+    if stale_only:
+        chunks = _stale_user_chunks(today.strftime("%Y-%m-%d"), batch_size)
+    else:
+        users = user_collection.find({"user_id": {"$exists": True}}, USER_PROJECTION, batch_size=batch_size)
+        chunks = _chunks(users, batch_size)
+
+    stats = {"users": 0, "written": 0, "cells": 0}
+    delays = {}
+    for chunk in chunks:
+        stats["written"] += _process_chunk(chunk, delays, today)
+        stats["users"] += len(chunk)
+
+    stats["cells"] = len(delays)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def _process_chunk(users: List[Dict], delays: Dict, today: datetime) -> int:
+    # Weather is looked up once per cell for the whole run
+    new_cells = {cell for cell in map(user_cell, users) if cell is not None and cell not in delays}
+    delays.update(weather_delays(new_cells))
+    return save_schedule(compute_schedule(users, delays, today))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the materialized watering schedule.")
+    parser.add_argument("--stale-only", action="store_true", help="only users whose schedule is missing or stale")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    print("[Watering Schedule]", rebuild_watering_schedule(args.batch_size, args.stale_only))
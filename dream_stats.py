@@ -0,0 +1,218 @@
+"""
+Per-user Dream Statistics
+-------------------------
+Every dream-based achievement rule depends on a few facts per user, kept in
+one `dream_stats` document per user (unique index on `user_id`):
+
+- dreams: number of dreams in GrowAI.dream_logs
+- unread: dreams whose `read` is False (not 0 or missing)
+- late_night / glitch / misty: 1 once any dream was logged between 01:00
+  and 04:00 / has sensor_status "invalid_fixed" / has dream_type "misty"
+- last_dream_id: newest dream _id
+
+Writers of dream_logs call `record_dream_write(before, after)` with the dream
+as it was and as it is after the write, which applies the difference with
+`$inc` / `$max`. A user without a document (first write, or first read in
+`get_dream_stats`) gets one computed from dream_logs instead.
+
+Recompute every document with one aggregation (also fixes drift from
+writers that bypassed `record_dream_write`):
+    python dream_stats.py
+
+The rebuild can run while dreams are written: a document written after the
+rebuild started keeps its incremental values (counted as "skipped") instead
+of being replaced by a result that may miss that write. Run it again, or
+with writes stopped, to also repair those users. `updated_at` is compared
+across machines, so their clocks must agree.
+
+Environment variables:
+- DREAM_STATS_BATCH_SIZE: documents per bulk write during a rebuild (default 1000)
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, time as clock
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+env_path = Path(__file__).parent / ".env_user"
+load_dotenv(dotenv_path=env_path)
+MONGO_URI = os.getenv("MONGODB_URI")
+client = MongoClient(MONGO_URI, connect=False)
+
+dream_log_collection = client["GrowAI"]["dream_logs"]
+stats_collection = client["user_data"]["dream_stats"]
+
+BATCH_SIZE = int(os.getenv("DREAM_STATS_BATCH_SIZE", "1000"))
+
+DUPLICATE_KEY = 11000
+
+# A datetime timestamp between 01:00 and 04:00 inclusive (BSON dates have
+# millisecond precision, so 04:00 means 04:00:00.000). The $cond guard keeps
+# $hour away from string timestamps, which it rejects.
+LATE_NIGHT = {"$cond": [{"$eq": [{"$type": "$timestamp"}, "date"]}, {"$or": [
+    {"$and": [{"$gte": [{"$hour": "$timestamp"}, 1]}, {"$lt": [{"$hour": "$timestamp"}, 4]}]},
+    {"$and": [{"$eq": [{"$hour": "$timestamp"}, 4]}, {"$eq": [{"$minute": "$timestamp"}, 0]},
+              {"$eq": [{"$second": "$timestamp"}, 0]}, {"$eq": [{"$millisecond": "$timestamp"}, 0]}]},
+]}, False]}
+
+EMPTY_STATS = {"dreams": 0, "unread": 0, "late_night": 0, "glitch": 0, "misty": 0, "last_dream_id": None}
+
+
+def _flag(condition) -> Dict:
+    return {"$max": {"$cond": [condition, 1, 0]}}
+
+
+def stats_pipeline(match: Dict) -> List[Dict]:
+    """The stats of every user matched, as one $group (_id is the user_id)."""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$user_id",
+            "dreams": {"$sum": 1},
+            # Aggregation $eq does not treat 0 as false
+            "unread": {"$sum": {"$cond": [{"$eq": ["$read", False]}, 1, 0]}},
+            "late_night": _flag(LATE_NIGHT),
+            "glitch": _flag({"$eq": ["$sensor_status", "invalid_fixed"]}),
+            "misty": _flag({"$eq": ["$dream_type", "misty"]}),
+            "last_dream_id": {"$max": "$_id"},
+        }},
+    ]
+
+
+def is_late_night(dream: Dict) -> bool:
+    ts = dream.get("timestamp")
+    return isinstance(ts, datetime) and clock(1, 0) <= ts.time() <= clock(4, 0)
+
+
+def dream_flags(dream: Dict) -> Dict[str, int]:
+    return {
+        "late_night": int(is_late_night(dream)),
+        "glitch": int(dream.get("sensor_status") == "invalid_fixed"),
+        "misty": int(dream.get("dream_type") == "misty"),
+    }
+
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        stats_collection.create_index("user_id", unique=True)
+        dream_log_collection.create_index([("user_id", 1), ("_id", 1)])
+        _indexes_ready = True
+
+
+def _stats_doc(user_id: str, result: Optional[Dict], updated_at: datetime) -> Dict:
+    doc = {"user_id": user_id, **EMPTY_STATS, "updated_at": updated_at}
+    doc.update({key: value for key, value in (result or {}).items() if key != "_id"})
+    return doc
+
+
+def rebuild_user(user_id: str) -> Optional[Dict]:
+    """
+    Recompute one user's document from dream_logs. Returns None when a
+    concurrent writer created the document first (both upserts inserted).
+    """
+    ensure_indexes()
+    result = next(dream_log_collection.aggregate(stats_pipeline({"user_id": user_id})), None)
+    doc = _stats_doc(user_id, result, datetime.utcnow())
+    try:
+        stats_collection.replace_one({"user_id": user_id}, doc, upsert=True)
+    except DuplicateKeyError:
+        return None
+    return doc
+
+
+def get_dream_stats(user_id: str) -> Dict:
+    """The user's dream stats document (computed on the first read)."""
+    doc = stats_collection.find_one({"user_id": user_id}, {"_id": 0})
+    if doc is None:
+        doc = rebuild_user(user_id) or stats_collection.find_one({"user_id": user_id}, {"_id": 0})
+    return doc
+
+
+def record_dream_write(before: Optional[Dict], after: Optional[Dict]):
+    """
+    Apply one dream write to the owners' documents: `before` is the stored
+    dream before the write (None for an insert), `after` the stored dream
+    afterwards (None for a delete). Flags and last_dream_id only ever rise;
+    a rebuild resets them.
+    """
+    deltas: Dict[str, Dict[str, int]] = {}
+    for sign, dream in ((-1, before), (1, after)):
+        if dream and dream.get("user_id"):
+            inc = deltas.setdefault(dream["user_id"], {"dreams": 0, "unread": 0})
+            inc["dreams"] += sign
+            inc["unread"] += sign * int(dream.get("read") is False)
+
+    now = datetime.utcnow()
+    for user_id, inc in deltas.items():
+        update = {"$set": {"updated_at": now}}
+        inc = {key: value for key, value in inc.items() if value}
+        if inc:
+            update["$inc"] = inc
+        if after and after.get("user_id") == user_id:
+            update["$max"] = {**dream_flags(after), "last_dream_id": after["_id"]}
+        if stats_collection.update_one({"user_id": user_id}, update).matched_count == 0:
+            # No document yet: compute it, the write itself included. If a
+            # concurrent first write created it meanwhile, its aggregation may
+            # already count this dream, so recompute (a replace) instead of $inc
+            if rebuild_user(user_id) is None:
+                rebuild_user(user_id)
+
+
+def _write_rebuilt(batch: List[ReplaceOne]) -> int:
+    """Bulk-write rebuilt documents. Returns how many were skipped as written since the rebuild started."""
+    try:
+        stats_collection.bulk_write(batch, ordered=False)
+        return 0
+    except BulkWriteError as e:
+        # A skipped replace falls through to an upsert insert, rejected by the unique index
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        return len(errors)
+
+
+def rebuild_dream_stats(batch_size: int = BATCH_SIZE) -> Dict:
+    """Recompute every user's document from one aggregation. Returns counters."""
+    start = time.perf_counter()
+    ensure_indexes()
+    rebuilt_at = datetime.utcnow()
+
+    stats = {"users": 0, "skipped": 0, "removed": 0}
+    batch = []
+    results = dream_log_collection.aggregate(stats_pipeline({"user_id": {"$exists": True, "$ne": None}}),
+                                             allowDiskUse=True)
+    for result in results:
+        # Only documents not written since the rebuild started: later $inc / $max are not lost
+        batch.append(ReplaceOne({"user_id": result["_id"], "updated_at": {"$lt": rebuilt_at}},
+                                _stats_doc(result["_id"], result, rebuilt_at), upsert=True))
+        if len(batch) >= batch_size:
+            skipped = _write_rebuilt(batch)
+            stats["users"] += len(batch) - skipped
+            stats["skipped"] += skipped
+            batch = []
+    if batch:
+        skipped = _write_rebuilt(batch)
+        stats["users"] += len(batch) - skipped
+        stats["skipped"] += skipped
+
+    # Documents not rebuilt (and not written since) belong to users without dreams
+    stats["removed"] = stats_collection.delete_many({"updated_at": {"$lt": rebuilt_at}}).deleted_count
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-user dream_stats documents.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    print("[Dream Stats]", rebuild_dream_stats(args.batch_size))
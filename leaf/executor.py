@@ -0,0 +1,158 @@
+"""
+Dedicated Inference Executor for /leaf/scan
+-------------------------------------------
+Image decoding, preprocessing and the ResNet18 forward pass are CPU-bound.
+Running them directly inside an `async def` route blocks uvicorn's event
+loop, so one slow scan would stall every other route in main.py.
+
+This module provides a bounded pool that keeps that work off the loop:
+- "thread":  ThreadPoolExecutor sharing the already loaded model
+             (torch releases the GIL inside its kernels)
+- "process": ProcessPoolExecutor, each worker loads its own model copy
+
+Environment variables:
+- LEAF_EXECUTOR:             thread | process (default: thread)
+- LEAF_EXECUTOR_WORKERS:     number of pool workers (default: 2)
+- LEAF_EXECUTOR_MAX_PENDING: max tasks admitted at once, queued + running
+                             (default: 4 x workers); extra callers wait
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from leaf import inference
+from leaf.leaf_model import load_serving_model
+
+EXECUTOR_KINDS = ("thread", "process")
+
+
+class InferenceExecutor:
+    """
+    Bounded thread/process pool with admission control and usage counters.
+
+    `run(fn, *args)` waits for a free slot (at most `max_pending` tasks are
+    admitted at once), then executes `fn` in the pool without blocking the
+    event loop.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 2,
+                 max_pending: int = None, runtime: str = None, model_path: str = None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind '{kind}', expected one of {EXECUTOR_KINDS}")
+
+        self.kind = kind
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(self.max_workers, int(max_pending or self.max_workers * 4))
+
+        if kind == "process":
+            # spawn: forking a process that already initialised torch threads can deadlock
+            threads_per_worker = max(1, (os.cpu_count() or 1) // self.max_workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=inference.init_worker_model,
+                initargs=(runtime, model_path, threads_per_worker),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="leaf-infer")
+
+        # Batch forward function run in this pool; create_executor binds it to
+        # the model loaded for a thread pool, process workers use their own copy
+        self.forward_fn = inference.predict_probs
+
+        self._slots = None
+        self._loop = None
+
+        # Metrics
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_run_seconds = 0.0
+
+    async def run(self, fn, *args):
+        """Execute fn(*args) in the pool once a slot is available."""
+        slots = self._get_slots()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            result = await self._loop.run_in_executor(self._pool, fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.total_run_seconds += time.perf_counter() - start
+            self.in_flight -= 1
+            slots.release()
+
+    def metrics(self) -> dict:
+        """Concurrency limits and current usage of the pool."""
+        finished = self.completed + self.failed
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_run_ms": round(self.total_run_seconds / finished * 1000, 2) if finished else 0.0,
+        }
+
+    def warm(self, inputs):
+        """Run `forward_fn` once per worker (blocking) so the first real batch is not slow."""
+        futures = [self._pool.submit(self.forward_fn, inputs) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+
+def create_executor(runtime: str = None, model_path: str = None) -> InferenceExecutor:
+    """
+    Build the inference executor configured from LEAF_EXECUTOR_* variables.
+
+    Thread pools share a model loaded here in the API process; process pools
+    load one model per worker instead. `runtime`/`model_path` default to
+    LEAF_MODEL_RUNTIME and that runtime's standard artifact.
+    """
+    kind = os.getenv("LEAF_EXECUTOR", "thread").lower()
+    if kind not in EXECUTOR_KINDS:
+        print(f"[Executor] Unknown LEAF_EXECUTOR '{kind}', using 'thread'")
+        kind = "thread"
+
+    workers = int(os.getenv("LEAF_EXECUTOR_WORKERS", "2"))
+    max_pending = os.getenv("LEAF_EXECUTOR_MAX_PENDING")
+
+    executor = InferenceExecutor(kind, workers, int(max_pending) if max_pending else None,
+                                 runtime, model_path)
+    if kind == "thread":
+        # Bind the model to this executor (not a module global) so a newer
+        # model can be loaded next to it and swapped in (see lazy_pipeline.py)
+        executor.forward_fn = functools.partial(inference.run_model, *load_serving_model(runtime, model_path))
+    return executor
@@ -0,0 +1,134 @@
+"""
+Leaf Classifier TorchScript Export
+----------------------------------
+Converts leaf_classifier_final_augmented.pth into a frozen TorchScript graph
+for CPU serving (LEAF_MODEL_RUNTIME=torchscript):
+
+1. Load the eager ResNet18 and convert weights to channels_last
+2. Trace it and freeze the graph (inlines weights, folds Conv+BatchNorm)
+3. Parity check against the eager model on a fixed image set
+4. Save leaf_classifier_final_augmented_frozen.pt only if parity passes
+
+The fixed image set is every .jpg/.png in leaf_samples/ (sorted). If that
+folder is missing, a seeded random batch is used instead.
+
+Usage:
+    python export_leaf_model.py [--images leaf_samples] [--atol 1e-4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from leaf.leaf_model import (
+    FROZEN_MODEL_PATH, LEAF_DIR, MODEL_PATH,
+    load_leaf_model, load_torchscript_model, transform
+)
+
+DEFAULT_IMAGE_DIR = os.path.join(LEAF_DIR, "leaf_samples")
+MAX_PARITY_IMAGES = 64
+
+
+def load_parity_batch(image_dir: str = DEFAULT_IMAGE_DIR, limit: int = MAX_PARITY_IMAGES) -> torch.Tensor:
+    """Fixed, ordered set of preprocessed images used for parity checks."""
+    if os.path.isdir(image_dir):
+        files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        tensors = [transform(Image.open(os.path.join(image_dir, f)).convert("RGB")) for f in files[:limit]]
+        if tensors:
+            return torch.stack(tensors)
+
+    print(f"[Export] No images found in '{image_dir}', using a seeded random batch.")
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(16, 3, 224, 224, generator=generator)
+
+
+def check_parity(reference, candidate, inputs: torch.Tensor, atol: float = 1e-4,
+                 channels_last: bool = True) -> dict:
+    """
+    Compare softmax outputs of two models on the same inputs.
+
+    Returns:
+        dict: max_abs_diff, label_agreement (0~1) and passed flag
+    """
+    with torch.no_grad():
+        ref = torch.nn.functional.softmax(reference(inputs), dim=1)
+        cand_inputs = inputs.contiguous(memory_format=torch.channels_last) if channels_last else inputs
+        cand = torch.nn.functional.softmax(candidate(cand_inputs), dim=1)
+
+    max_abs_diff = float((ref - cand).abs().max())
+    agreement = float((ref.argmax(dim=1) == cand.argmax(dim=1)).float().mean())
+    return {
+        "max_abs_diff": max_abs_diff,
+        "label_agreement": agreement,
+        "passed": max_abs_diff <= atol and agreement == 1.0
+    }
+
+
+def export_frozen_model(eager_model: torch.nn.Module, example: torch.Tensor) -> torch.jit.ScriptModule:
+    """Trace + freeze the eager model with channels_last weights."""
+    model = eager_model.to(memory_format=torch.channels_last)
+    example = example.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        return torch.jit.freeze(traced.eval())
+
+
+def time_per_image(model, inputs: torch.Tensor, runs: int = 20) -> float:
+    """Average single-image latency in milliseconds."""
+    single = inputs[:1]
+    with torch.no_grad():
+        for _ in range(3):
+            model(single)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(single)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the leaf classifier as a frozen TorchScript graph.")
+    parser.add_argument("--weights", default=MODEL_PATH, help="Eager state_dict (.pth)")
+    parser.add_argument("--output", default=FROZEN_MODEL_PATH, help="Frozen TorchScript output (.pt)")
+    parser.add_argument("--images", default=DEFAULT_IMAGE_DIR, help="Folder with the fixed parity image set")
+    parser.add_argument("--atol", type=float, default=1e-4, help="Max allowed softmax difference")
+    args = parser.parse_args()
+
+    inputs = load_parity_batch(args.images)
+
+    start = time.perf_counter()
+    eager = load_leaf_model(args.weights)
+    eager_load_ms = (time.perf_counter() - start) * 1000
+
+    frozen = export_frozen_model(load_leaf_model(args.weights), inputs[:1])
+
+    # Save to a temp file and check the reloaded graph, exactly as the API will load it
+    tmp_path = args.output + ".tmp"
+    torch.jit.save(frozen, tmp_path)
+    start = time.perf_counter()
+    served = load_torchscript_model(tmp_path)
+    frozen_load_ms = (time.perf_counter() - start) * 1000
+
+    parity = check_parity(eager, served, inputs, args.atol)
+    print(f"[Export] Parity on {len(inputs)} images: max |Δp| = {parity['max_abs_diff']:.2e}, "
+          f"label agreement = {parity['label_agreement']:.2%}")
+
+    if not parity["passed"]:
+        os.remove(tmp_path)
+        print(f"[Export] Parity check FAILED (atol={args.atol}). Frozen model not written.")
+        sys.exit(1)
+
+    os.replace(tmp_path, args.output)
+    print(f"[Export] Saved frozen model to {args.output}")
+    print(f"[Export] Load time: eager {eager_load_ms:.0f} ms | frozen {frozen_load_ms:.0f} ms")
+    print(f"[Export] Latency per image: eager {time_per_image(eager, inputs):.1f} ms | "
+          f"frozen {time_per_image(served, inputs.contiguous(memory_format=torch.channels_last)):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
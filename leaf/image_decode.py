@@ -0,0 +1,76 @@
+"""
+Reduced-Resolution Image Decoding for Leaf Scans
+------------------------------------------------
+Phone photos uploaded to /leaf/scan are often 12 MP or larger, but the model
+only sees 224x224 and the colour features do not need more detail than that.
+
+`decode_leaf_image` decodes directly near the target size:
+- JPEG: DCT-domain downscaling (PIL draft mode, 1/2, 1/4 or 1/8 scale)
+- Other formats: integer box reduction after decoding
+- EXIF orientation is applied so rotated phone photos come out upright
+
+The short side is kept at or above DECODE_MIN_SIDE, so the model's
+224x224 resize still only downsamples.
+"""
+
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+DECODE_MIN_SIDE = 256
+
+
+def decode_leaf_image(contents: bytes, min_side: int = DECODE_MIN_SIDE) -> Tuple[Image.Image, float]:
+    """
+    Decode uploaded image bytes to a small RGB image.
+
+    Returns:
+        (img, pixel_scale): pixel_scale = original pixel count / decoded pixel
+        count, used to keep pixel-count features (e.g. brown) on the scale of
+        the original photo.
+    """
+    img = Image.open(BytesIO(contents))
+    orig_w, orig_h = img.size
+    short_side = min(orig_w, orig_h)
+
+    if img.format == "JPEG" and short_side > min_side:
+        ratio = min_side / short_side
+        img.draft("RGB", (max(1, int(orig_w * ratio)), max(1, int(orig_h * ratio))))
+
+    img = ImageOps.exif_transpose(img)
+    img = img.convert("RGB")
+
+    factor = min(img.size) // min_side
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    pixel_scale = (orig_w * orig_h) / (img.size[0] * img.size[1])
+    return img, pixel_scale
+
+
+# Benchmark: full decode vs reduced decode (for testing only)
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            data = f.read()
+    else:
+        # Synthetic 12 MP phone photo
+        buffer = BytesIO()
+        Image.effect_noise((4032, 3024), 64).convert("RGB").save(buffer, "JPEG", quality=90)
+        data = buffer.getvalue()
+
+    def full_decode(contents):
+        return Image.open(BytesIO(contents)).convert("RGB"), 1.0
+
+    for name, fn in [("full decode", full_decode), ("reduced decode", decode_leaf_image)]:
+        start = time.perf_counter()
+        for _ in range(5):
+            img, _ = fn(data)
+        elapsed = (time.perf_counter() - start) / 5 * 1000
+        # Decoded RGB buffer dominates peak memory per request
+        buffer_mb = img.size[0] * img.size[1] * 3 / 1e6
+        print(f"{name:15s}: {elapsed:7.1f} ms | RGB buffer {buffer_mb:6.2f} MB | size {img.size}")
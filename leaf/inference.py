@@ -0,0 +1,230 @@
+"""
+Micro-batching Inference Engine for the Leaf Classifier
+-------------------------------------------------------
+Concurrent /leaf/scan requests each carry a single image. Running the
+ResNet18 once per request spends most of the CPU time on per-call overhead,
+so this engine gathers requests that arrive close together into one batch,
+runs a single forward pass and hands every caller its own softmax row.
+
+Trade-off between throughput and tail latency is selected with a policy:
+- "latency":    small batches, no waiting (lowest p99, least batching)
+- "balanced":   moderate batches, a few milliseconds of waiting (default)
+- "throughput": large batches, longer waiting (highest images/sec)
+
+Environment variables:
+- LEAF_BATCH_POLICY:      latency | balanced | throughput
+- LEAF_BATCH_MAX_SIZE:    overrides the policy's max batch size
+- LEAF_BATCH_MAX_WAIT_MS: overrides the policy's max wait time (ms)
+
+The module-level worker functions (`prepare_scan`, `predict_probs`) are what
+actually runs inside the inference executor (see executor.py). They only
+touch per-process state, so the same code serves both thread and process pools.
+"""
+
+import asyncio
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+import torch
+
+from leaf.leaf_model import load_serving_model, transform
+from leaf.leaf_features import extract_leaf_features_from_tensor
+from leaf.image_decode import decode_leaf_image
+
+BATCH_POLICIES = {
+    "latency": {"max_batch_size": 4, "max_wait_ms": 0.0},
+    "balanced": {"max_batch_size": 8, "max_wait_ms": 5.0},
+    "throughput": {"max_batch_size": 32, "max_wait_ms": 20.0},
+}
+DEFAULT_POLICY = "balanced"
+
+
+def engine_settings_from_env() -> Dict[str, float]:
+    """
+    Resolve batching settings from LEAF_BATCH_* environment variables.
+    Explicit size/wait values take precedence over the named policy.
+    """
+    policy = os.getenv("LEAF_BATCH_POLICY", DEFAULT_POLICY).lower()
+    if policy not in BATCH_POLICIES:
+        print(f"[Inference] Unknown LEAF_BATCH_POLICY '{policy}', using '{DEFAULT_POLICY}'")
+        policy = DEFAULT_POLICY
+
+    settings = dict(BATCH_POLICIES[policy])
+    if os.getenv("LEAF_BATCH_MAX_SIZE"):
+        settings["max_batch_size"] = int(os.getenv("LEAF_BATCH_MAX_SIZE"))
+    if os.getenv("LEAF_BATCH_MAX_WAIT_MS"):
+        settings["max_wait_ms"] = float(os.getenv("LEAF_BATCH_MAX_WAIT_MS"))
+    return settings
+
+
+# ---------------------------------------------------------------------------
+# Worker-side functions (run inside the inference executor)
+# ---------------------------------------------------------------------------
+
+_worker_model: Optional[torch.nn.Module] = None
+_worker_channels_last = False
+
+
+def set_worker_model(model: torch.nn.Module, channels_last: bool = False):
+    """Install an already loaded model for in-process (thread pool) workers."""
+    global _worker_model, _worker_channels_last
+    _worker_model = model
+    _worker_channels_last = channels_last
+
+
+def init_worker_model(runtime: str = None, model_path: str = None, num_threads: int = 0):
+    """Process pool initializer: load the classifier once per worker process."""
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    set_worker_model(*load_serving_model(runtime, model_path))
+
+
+def prepare_scan(contents: bytes) -> Tuple[torch.Tensor, dict]:
+    """
+    Decode uploaded image bytes near the model's input size, build the model
+    input tensor (C, H, W) and extract the colour/shape features used for
+    scoring from that same tensor.
+    """
+    img, pixel_scale = decode_leaf_image(contents)
+    input_tensor = transform(img)
+
+    # Rescale pixel counts from the 224x224 tensor to the original photo
+    tensor_scale = pixel_scale * img.size[0] * img.size[1] / (input_tensor.shape[1] * input_tensor.shape[2])
+    return input_tensor, extract_leaf_features_from_tensor(input_tensor, tensor_scale)
+
+
+def run_model(model: torch.nn.Module, channels_last: bool, inputs: torch.Tensor) -> torch.Tensor:
+    """Run one forward pass of `model` over a batch and return softmax probabilities."""
+    if channels_last:
+        inputs = inputs.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        return torch.nn.functional.softmax(model(inputs), dim=1)
+
+
+def predict_probs(inputs: torch.Tensor) -> torch.Tensor:
+    """Forward pass with this worker's model (process pool workers)."""
+    if _worker_model is None:
+        raise RuntimeError("Leaf model is not loaded in this worker.")
+    return run_model(_worker_model, _worker_channels_last, inputs)
+
+
+# ---------------------------------------------------------------------------
+# Micro-batching engine (runs on the event loop)
+# ---------------------------------------------------------------------------
+
+class BatchingInferenceEngine:
+    """
+    Groups concurrent single-image requests into micro-batches.
+
+    A batch is dispatched as soon as `max_batch_size` requests are queued or
+    `max_wait_ms` has passed since the first request of the batch arrived.
+    `forward_fn` maps a stacked batch to softmax probabilities. It runs in
+    `executor` (an InferenceExecutor, or None for the loop's default executor)
+    so the event loop keeps serving other routes while the model runs.
+    """
+
+    def __init__(self, forward_fn: Callable[[torch.Tensor], torch.Tensor] = predict_probs,
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 executor=None):
+        self.forward_fn = forward_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+
+        # Simple counters for monitoring
+        self.batches_run = 0
+        self.items_run = 0
+
+    async def submit(self, input_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Queue one preprocessed image tensor (C, H, W) and wait for its result.
+
+        Returns:
+            torch.Tensor: softmax probabilities for this image, shape (num_classes,)
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((input_tensor, future))
+        return await future
+
+    def stats(self) -> dict:
+        """Return batching counters (used by the metrics endpoint)."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "avg_batch_size": round(self.items_run / self.batches_run, 2) if self.batches_run else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    def close(self):
+        """Stop the batching task (thread-safe; used when a model is retired)."""
+        if self._worker is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._worker.cancel)
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    # Deadline passed: still take whatever is already waiting
+                    try:
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    except asyncio.QueueEmpty:
+                        break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        # Skip callers that gave up (e.g. client disconnected)
+        batch = [(tensor, future) for tensor, future in batch if not future.cancelled()]
+        if not batch:
+            return
+
+        futures = [future for _, future in batch]
+        try:
+            inputs = torch.stack([tensor for tensor, _ in batch])
+            if self.executor is not None:
+                probs = await self.executor.run(self.forward_fn, inputs)
+            else:
+                probs = await self._loop.run_in_executor(None, self.forward_fn, inputs)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.items_run += len(futures)
+        for future, row in zip(futures, probs):
+            if not future.done():
+                future.set_result(row)
+
+
+def create_engine(executor=None) -> BatchingInferenceEngine:
+    """
+    Build an engine configured from the environment. Uses the executor's
+    model-bound forward function when it has one (thread pools).
+    """
+    forward_fn = getattr(executor, "forward_fn", None) or predict_probs
+    return BatchingInferenceEngine(forward_fn, executor=executor, **engine_settings_from_env())
@@ -0,0 +1,183 @@
+"""
+Lazily Built, Hot-Swappable Scan Pipeline
+-----------------------------------------
+Importing torch/torchvision and loading the classifier takes seconds, which
+slows autoscaling and every test that imports main.py. The API modules hold a
+LazyScanPipeline instead of a ScanPipeline: nothing heavy is imported until
+the first scan request or an explicit `warmup()` (see /warmup in main.py).
+
+Model versions come from the model registry (model_registry.py) when it has a
+manifest, otherwise from LEAF_MODEL_RUNTIME and the fixed artifact paths.
+A new active version is picked up by polling the manifest every
+LEAF_MODEL_POLL_SECONDS (default 30, 0 disables) or via `start_reload()`
+(POST /leaf/reload). It is loaded and warmed in the background, then swapped
+in with a single reference assignment; requests already running finish on the
+old pipeline, which is shut down once it has drained.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from leaf.model_registry import ModelRegistry, get_registry
+
+# Requests pick up the pipeline reference synchronously; this grace period
+# covers one that read the old reference just before the swap
+RETIRE_GRACE_SECONDS = 1.0
+RETIRE_TIMEOUT_SECONDS = 120.0
+
+
+class LazyScanPipeline:
+    """Same `analyze` / `metrics` interface as ScanPipeline, built on first use."""
+
+    def __init__(self, runtime: str = None, model_path: str = None,
+                 registry: ModelRegistry = None, poll_seconds: float = None):
+        self.runtime = runtime
+        self.model_path = model_path
+        self.registry = registry or get_registry()
+        self.poll_seconds = float(os.getenv("LEAF_MODEL_POLL_SECONDS", "30")) if poll_seconds is None else poll_seconds
+        self.load_seconds = None
+        self.swaps = 0
+        self.retiring = 0
+        self.last_reload_error = None
+        self._pipeline = None
+        self._lock = threading.RLock()  # one load/swap at a time; also guards `retiring`
+        self._poller = None
+        self._reloader = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._pipeline is not None
+
+    def get(self):
+        """Return the ScanPipeline, importing torch and loading the model if needed."""
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = self._build(*self._target())
+                    self._start_polling()
+        return self._pipeline
+
+    def warmup(self):
+        """Load the pipeline now (blocking)."""
+        self.get()
+
+    def reload(self) -> dict:
+        """
+        Load the registry's active version and swap it in if it differs from
+        the one being served (blocking; safe to call from any thread).
+        """
+        with self._lock:
+            if self._pipeline is None:
+                self.get()
+                return {"swapped": False, "model_version": self._pipeline.model_version}
+
+            old = self._pipeline
+            try:
+                runtime, model_path, version = self._target()
+                if version is not None and version == old.model_version:
+                    return {"swapped": False, "model_version": version}
+                new = self._build(runtime, model_path, version, cache=old.cache)
+            except Exception as e:
+                # Keep serving the current model
+                self.last_reload_error = str(e)
+                raise
+            if new.model_version == old.model_version:
+                new.close()
+                return {"swapped": False, "model_version": old.model_version}
+
+            self._pipeline = new  # atomic: new requests use the new model from here on
+            self.swaps += 1
+            self.retiring += 1
+            self.last_reload_error = None
+            print(f"[Scan Pipeline] Swapped {old.model_version} -> {new.model_version}")
+
+        threading.Thread(target=self._retire, args=(old,), daemon=True,
+                         name="leaf-retire").start()
+        return {"swapped": True, "model_version": new.model_version,
+                "previous_version": old.model_version}
+
+    def start_reload(self) -> dict:
+        """
+        Run reload() in a background thread and return at once with the
+        version being loaded (None = the fixed artifact). Progress and errors
+        show in metrics() (`reloading`, `swaps`, `last_reload_error`).
+        """
+        target = self.registry.active_version() if not self.model_path and self.registry.exists() else None
+        with self._lock:
+            if self._reloader is not None and self._reloader.is_alive():
+                return {"status": "already reloading", "model_version": target}
+            self._reloader = threading.Thread(target=self._background_reload, daemon=True, name="leaf-reload")
+            self._reloader.start()
+        return {"status": "reloading", "model_version": target}
+
+    def _background_reload(self):
+        try:
+            self.reload()
+        except Exception as e:
+            # reload() already recorded last_reload_error; the current model keeps serving
+            print("[Scan Pipeline] Reload failed:", e)
+
+    async def analyze(self, contents: bytes) -> dict:
+        pipeline = self._pipeline
+        if pipeline is None:
+            # First request pays the load, but off the event loop
+            pipeline = await asyncio.get_running_loop().run_in_executor(None, self.get)
+        return await pipeline.analyze(contents)
+
+    def metrics(self) -> dict:
+        if self._pipeline is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "load_seconds": self.load_seconds,
+            "swaps": self.swaps,
+            "retiring": self.retiring,
+            "reloading": self._reloader is not None and self._reloader.is_alive(),
+            "last_reload_error": self.last_reload_error,
+            **self._pipeline.metrics()
+        }
+
+    def _target(self):
+        """(runtime, model_path, version) to serve; version None = hash the file."""
+        if self.model_path or not self.registry.exists():
+            return self.runtime, self.model_path, None
+        entry = self.registry.resolve()
+        return entry["runtime"], entry["path"], entry["version"]
+
+    def _build(self, runtime, model_path, version, cache=None):
+        from leaf.scan_pipeline import create_scan_pipeline
+
+        start = time.perf_counter()
+        pipeline = create_scan_pipeline(runtime, model_path, version, cache)
+        pipeline.warm()
+        self.load_seconds = round(time.perf_counter() - start, 3)
+        print(f"[Scan Pipeline] Loaded {pipeline.model_version} in {self.load_seconds}s")
+        return pipeline
+
+    def _retire(self, old):
+        time.sleep(RETIRE_GRACE_SECONDS)
+        deadline = time.monotonic() + RETIRE_TIMEOUT_SECONDS
+        while (old.active_requests or old.executor.in_flight or old.executor.waiting) \
+                and time.monotonic() < deadline:
+            time.sleep(0.05)
+        old.close()
+        with self._lock:
+            self.retiring -= 1
+        print(f"[Scan Pipeline] Retired {old.model_version}")
+
+    def _start_polling(self):
+        if self._poller is not None or self.poll_seconds <= 0 or self.model_path:
+            return
+        self._poller = threading.Thread(target=self._poll, daemon=True, name="leaf-registry-poll")
+        self._poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                if self.registry.exists() and self.registry.active_version() != self._pipeline.model_version:
+                    self.reload()
+            except Exception as e:
+                print("[Scan Pipeline] Reload failed:", e)
@@ -0,0 +1,170 @@
+"""
+Leaf Visual Feature Extraction
+------------------------------
+Turns a leaf image into the feature dict consumed by
+leaf.scoring.feature_score.calculate_leaf_score.
+
+- extract_leaf_features:             reference version on a PIL image
+- extract_leaf_features_from_tensor: fused version used by /leaf/scan. It
+  reuses the model's normalized 224x224 input tensor and computes the
+  yellow, brown and black-spot masks in one vectorized HSV pass.
+
+Environment variables:
+- LEAF_BLACK_SPOT_SCORE: "1" adds color.black_spot_ratio to the features, which
+  calculate_leaf_score deducts (up to 0.2). Off by default: dark photo
+  backgrounds also count as black spots, and /leaf/scan scores would change.
+"""
+
+import os
+
+import numpy as np
+from PIL import Image
+
+# Normalization used by leaf_model.transform (ImageNet statistics)
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+# Pixels darker than this (HSV value, 0-255) count as black spots
+BLACK_SPOT_MAX_VALUE = 40
+BLACK_SPOT_SCORE = os.getenv("LEAF_BLACK_SPOT_SCORE", "0") == "1"
+
+
+def extract_leaf_features(img: Image.Image, pixel_scale: float = 1.0) -> dict:
+    """
+    Analyze leaf image and extract basic visual features.
+    Returns features in the format required by calculate_leaf_score.
+
+    pixel_scale: original / analysed pixel count when `img` was decoded at
+    reduced resolution, so pixel counts stay on the original photo's scale.
+    """
+    np_img = np.array(img)
+
+    # Convert to HSV for better color segmentation
+    hsv = np.array(img.convert("HSV"))
+
+    # --- Color Features ---
+    yellow_mask = ((hsv[:, :, 0] >= 20) & (hsv[:, :, 0] <= 40)) & (hsv[:, :, 1] > 50)
+    brown_mask = ((hsv[:, :, 0] >= 10) & (hsv[:, :, 0] <= 20)) & (hsv[:, :, 1] > 30)
+
+    yellow_ratio = yellow_mask.sum() / (np_img.shape[0] * np_img.shape[1])
+    brown_pixels = brown_mask.sum() * pixel_scale
+
+    # --- Shape Features (dummy logic, improve later) ---
+    irregularity = 0.3  # Fixed for now
+    holes_detected = False  # Not implemented yet
+
+    return {
+        "color": {
+            "yellow_ratio": round(float(yellow_ratio), 2),
+            "brown": int(round(float(brown_pixels)))
+        },
+        "shape": {
+            "irregularity": irregularity,
+            "holes_detected": holes_detected
+        }
+    }
+
+
+def _hue_saturation_value(rgb: np.ndarray):
+    """
+    HSV channels (0-255, uint8 semantics) of a (3, H, W) RGB array in 0-255,
+    matching PIL's Image.convert("HSV") exactly: float32 ratios, double
+    precision hue wrap and truncation to int.
+    """
+    r, g, b = rgb[0], rgb[1], rgb[2]
+    maxc = rgb.max(axis=0)
+    minc = rgb.min(axis=0)
+    cr = maxc - minc
+    grey = cr == 0
+    safe_cr = np.where(grey, np.float32(1), cr)
+    safe_max = np.where(maxc == 0, np.float32(1), maxc)
+
+    rc = ((maxc - r) / safe_cr).astype(np.float64)
+    gc = ((maxc - g) / safe_cr).astype(np.float64)
+    bc = ((maxc - b) / safe_cr).astype(np.float64)
+    # Same operation order and float32 rounding points as PIL's rgb2hsv_row
+    h = np.where(r == maxc, (bc - gc).astype(np.float32),
+                 np.where(g == maxc, (2.0 + rc - bc).astype(np.float32),
+                          (4.0 + gc - rc).astype(np.float32)))
+    h = np.fmod(h.astype(np.float64) / 6.0 + 1.0, 1.0).astype(np.float32).astype(np.float64)
+
+    hue = np.where(grey, 0, np.clip((h * 255.0).astype(np.int32), 0, 255))
+    sat = np.where(grey, 0, np.clip(((cr / safe_max).astype(np.float64) * 255.0).astype(np.int32), 0, 255))
+    return hue, sat, maxc
+
+
+def extract_leaf_features_from_tensor(input_tensor, pixel_scale: float = 1.0,
+                                     black_spots: bool = BLACK_SPOT_SCORE) -> dict:
+    """
+    Fused feature extractor working on the model input tensor.
+
+    Parameters:
+        input_tensor: normalized (3, H, W) tensor produced by leaf_model.transform
+        pixel_scale: original photo pixel count / (H * W), so `brown` stays a
+                     pixel count on the original photo's scale
+        black_spots: also return color.black_spot_ratio (LEAF_BLACK_SPOT_SCORE)
+
+    Returns:
+        dict: same schema as extract_leaf_features, plus color.black_spot_ratio
+              when `black_spots` is set
+    """
+    normalized = input_tensor.numpy() if hasattr(input_tensor, "numpy") else np.asarray(input_tensor)
+
+    # Undo Normalize + ToTensor to recover the resized 8-bit RGB pixels
+    rgb = np.clip(np.rint((normalized * IMAGENET_STD + IMAGENET_MEAN) * 255), 0, 255).astype(np.float32)
+    hue, sat, value = _hue_saturation_value(rgb)
+
+    yellow_mask = (hue >= 20) & (hue <= 40) & (sat > 50)
+    brown_mask = (hue >= 10) & (hue <= 20) & (sat > 30)
+
+    total = hue.size
+    features = {
+        "color": {
+            "yellow_ratio": round(float(yellow_mask.sum() / total), 2),
+            "brown": int(round(float(brown_mask.sum() * pixel_scale)))
+        },
+        "shape": {
+            "irregularity": 0.3,  # Fixed for now
+            "holes_detected": False  # Not implemented yet
+        }
+    }
+    if black_spots:
+        black_mask = value < BLACK_SPOT_MAX_VALUE
+        features["color"]["black_spot_ratio"] = round(float(black_mask.sum() / total), 2)
+    return features
+
+
+# Benchmark: PIL reference on the decoded photo vs fused tensor path (for testing only)
+if __name__ == "__main__":
+    import time
+    from io import BytesIO
+
+    from leaf.image_decode import decode_leaf_image
+    from leaf.leaf_model import transform
+
+    buffer = BytesIO()
+    Image.effect_noise((4032, 3024), 64).convert("RGB").save(buffer, "JPEG", quality=90)
+    img, pixel_scale = decode_leaf_image(buffer.getvalue())
+    tensor = transform(img)
+    tensor_scale = pixel_scale * img.size[0] * img.size[1] / (tensor.shape[1] * tensor.shape[2])
+
+    runs = 50
+    start = time.perf_counter()
+    for _ in range(runs):
+        extract_leaf_features(img, pixel_scale)
+    reference_ms = (time.perf_counter() - start) / runs * 1000
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        extract_leaf_features_from_tensor(tensor, tensor_scale)
+    fused_ms = (time.perf_counter() - start) / runs * 1000
+
+    full = Image.open(BytesIO(buffer.getvalue())).convert("RGB")
+    start = time.perf_counter()
+    extract_leaf_features(full)
+    full_res_ms = (time.perf_counter() - start) * 1000
+
+    print(f"reference, full-res photo {full.size}: {full_res_ms:7.2f} ms")
+    print(f"reference, decoded image {img.size}: {reference_ms:7.2f} ms")
+    print(f"fused, model tensor {tuple(tensor.shape[1:])}:  {fused_ms:7.2f} ms "
+          f"({reference_ms / fused_ms:.1f}x vs decoded, {full_res_ms / fused_ms:.1f}x vs full-res)")
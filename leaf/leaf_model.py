@@ -0,0 +1,137 @@
+"""
+Leaf Classifier Model Loader
+----------------------------
+Builds the ResNet18 leaf classifier served by the /leaf/scan API and loads
+the trained weights from disk.
+
+Shared by leaf_api.py and database/leaf_api.py so the preprocessing pipeline
+and label mapping stay identical to training.
+
+Serving runtimes (LEAF_MODEL_RUNTIME):
+- "eager":       torchvision ResNet18 + state_dict (default)
+- "torchscript": frozen TorchScript graph produced by export_leaf_model.py
+                 (Conv+BN folded, channels_last weights)
+- "int8":        post-training quantized graph produced by quantize_leaf_model.py
+"""
+
+import hashlib
+import os
+import torch
+import torchvision.transforms as transforms
+from torchvision.models import resnet18
+
+LEAF_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(LEAF_DIR, "leaf_classifier_final_augmented.pth")
+FROZEN_MODEL_PATH = os.path.join(LEAF_DIR, "leaf_classifier_final_augmented_frozen.pt")
+INT8_MODEL_PATH = os.path.join(LEAF_DIR, "leaf_classifier_final_augmented_int8.pt")
+
+MODEL_RUNTIMES = ("eager", "torchscript", "int8")
+
+# Image preprocessing pipeline (must match training)
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                         std=[0.229, 0.224, 0.225])
+])
+
+# Index-to-label mapping (based on training classes)
+idx_to_label = {
+    0: "healthy",
+    1: "wilted"
+}
+
+
+def build_leaf_model() -> torch.nn.Module:
+    """Create an untrained ResNet18 with a 2-class head."""
+    model = resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, 2)
+    return model
+
+
+def load_leaf_model(model_path: str = MODEL_PATH) -> torch.nn.Module:
+    """
+    Load the trained leaf classifier (state_dict weights only) on CPU
+    and switch it to evaluation mode.
+    """
+    model = build_leaf_model()
+    state_dict = torch.load(model_path, map_location=torch.device("cpu"))
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+
+def load_torchscript_model(model_path: str = FROZEN_MODEL_PATH) -> torch.jit.ScriptModule:
+    """
+    Load the frozen TorchScript classifier and apply CPU inference passes
+    (MKLDNN fusion). These passes are applied after loading because the
+    optimized graph cannot be serialized.
+    """
+    model = torch.jit.load(model_path, map_location=torch.device("cpu"))
+    model.eval()
+    return torch.jit.optimize_for_inference(model)
+
+
+def select_quantized_engine() -> str:
+    """Pick the best available int8 CPU backend (x86 > fbgemm > qnnpack)."""
+    supported = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in supported:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("No quantized CPU backend available in this torch build.")
+
+
+def load_int8_model(model_path: str = INT8_MODEL_PATH) -> torch.jit.ScriptModule:
+    """Load the int8 TorchScript classifier on the matching quantized backend."""
+    select_quantized_engine()
+    model = torch.jit.load(model_path, map_location=torch.device("cpu"))
+    model.eval()
+    return model
+
+
+def get_model_runtime() -> str:
+    """Serving runtime selected via LEAF_MODEL_RUNTIME (default: eager)."""
+    runtime = os.getenv("LEAF_MODEL_RUNTIME", "eager").lower()
+    if runtime not in MODEL_RUNTIMES:
+        print(f"[Leaf Model] Unknown LEAF_MODEL_RUNTIME '{runtime}', using 'eager'")
+        runtime = "eager"
+    return runtime
+
+
+def resolve_model_path(runtime: str = None, model_path: str = None) -> str:
+    """Artifact path for a runtime (explicit model_path wins)."""
+    if model_path:
+        return model_path
+    runtime = runtime or get_model_runtime()
+    return {"torchscript": FROZEN_MODEL_PATH, "int8": INT8_MODEL_PATH}.get(runtime, MODEL_PATH)
+
+
+def model_version(runtime: str = None, model_path: str = None) -> str:
+    """
+    Content-derived version string, e.g. "eager-3f9a1c2b7d4e".
+    Changes whenever the runtime or the weights file changes.
+    """
+    runtime = runtime or get_model_runtime()
+    digest = hashlib.sha256()
+    with open(resolve_model_path(runtime, model_path), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{runtime}-{digest.hexdigest()[:12]}"
+
+
+def load_serving_model(runtime: str = None, model_path: str = None):
+    """
+    Load the classifier for the given runtime.
+
+    Returns:
+        (model, channels_last): channels_last tells callers to convert input
+        batches to torch.channels_last before the forward pass.
+    """
+    runtime = runtime or get_model_runtime()
+    model_path = resolve_model_path(runtime, model_path)
+    if runtime == "torchscript":
+        return load_torchscript_model(model_path), True
+    if runtime == "int8":
+        return load_int8_model(model_path), False
+    return load_leaf_model(model_path), False
@@ -0,0 +1,165 @@
+"""
+Leaf Model Registry
+-------------------
+Versioned store for the artifacts served by /leaf/scan, so a retrained
+classifier can be shipped without restarting API workers.
+
+Layout (LEAF_MODEL_REGISTRY_DIR, default leaf/model_registry/):
+
+    manifest.json
+    eager-3f9a1c2b7d4e.pth
+    torchscript-90b1d2c4e5f6.pt
+
+manifest.json:
+
+    {
+      "active": "eager-3f9a1c2b7d4e",
+      "models": {
+        "eager-3f9a1c2b7d4e": {
+          "file": "eager-3f9a1c2b7d4e.pth",
+          "runtime": "eager",
+          "sha256": "3f9a1c2b7d4e...",
+          "registered_at": "2025-06-01T12:00:00"
+        }
+      }
+    }
+
+Versions are "<runtime>-<sha256[:12]>" (same format as leaf_model.model_version),
+so scan cache keys stay valid across registry and non-registry deployments.
+The manifest is replaced atomically; the API polls it (or is signalled via
+POST /leaf/reload) and hot-swaps to the active version.
+
+Usage (from the project root):
+    python -m leaf.model_registry register path/to/model.pth [--runtime eager] [--no-activate]
+    python -m leaf.model_registry activate eager-3f9a1c2b7d4e
+    python -m leaf.model_registry list
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Optional
+
+# No torch import here: the API checks the manifest at startup and while polling
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_registry")
+MODEL_RUNTIMES = ("eager", "torchscript", "int8")  # see leaf_model.MODEL_RUNTIMES
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Directory of model artifacts described by a content-hashed manifest."""
+
+    def __init__(self, root: str = DEFAULT_REGISTRY_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def manifest(self) -> Dict:
+        if not self.exists():
+            return {"active": None, "models": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def active_version(self) -> Optional[str]:
+        return self.manifest().get("active")
+
+    def resolve(self, version: str = None, verify: bool = True) -> Dict:
+        """
+        Entry for `version` (default: active) with an absolute `path`.
+        Raises ValueError if the version is unknown or the file does not match its hash.
+        """
+        manifest = self.manifest()
+        version = version or manifest.get("active")
+        entry = manifest.get("models", {}).get(version)
+        if entry is None:
+            raise ValueError(f"Model version '{version}' is not registered in {self.root}")
+
+        entry = dict(entry, version=version, path=os.path.join(self.root, entry["file"]))
+        if verify and file_sha256(entry["path"]) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for model version '{version}' ({entry['path']})")
+        return entry
+
+    def register(self, source_path: str, runtime: str = "eager", activate: bool = True) -> str:
+        """Copy an artifact into the registry and return its version."""
+        if runtime not in MODEL_RUNTIMES:
+            raise ValueError(f"Unknown runtime '{runtime}', expected one of {MODEL_RUNTIMES}")
+
+        os.makedirs(self.root, exist_ok=True)
+        sha256 = file_sha256(source_path)
+        version = f"{runtime}-{sha256[:12]}"
+        filename = version + os.path.splitext(source_path)[1]
+
+        target = os.path.join(self.root, filename)
+        if not os.path.exists(target):
+            shutil.copyfile(source_path, target + ".tmp")
+            os.replace(target + ".tmp", target)
+
+        manifest = self.manifest()
+        manifest.setdefault("models", {})[version] = {
+            "file": filename,
+            "runtime": runtime,
+            "sha256": sha256,
+            "registered_at": datetime.utcnow().isoformat(timespec="seconds")
+        }
+        if activate:
+            manifest["active"] = version
+        self._write_manifest(manifest)
+        return version
+
+    def activate(self, version: str):
+        """Point the manifest at an already registered version (also used for rollback)."""
+        self.resolve(version)
+        manifest = self.manifest()
+        manifest["active"] = version
+        self._write_manifest(manifest)
+
+    def _write_manifest(self, manifest: Dict):
+        tmp_path = self.manifest_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def get_registry() -> ModelRegistry:
+    """Registry at LEAF_MODEL_REGISTRY_DIR (default leaf/model_registry/)."""
+    return ModelRegistry(os.getenv("LEAF_MODEL_REGISTRY_DIR") or DEFAULT_REGISTRY_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the leaf model registry.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    reg = sub.add_parser("register", help="Add a model artifact")
+    reg.add_argument("path")
+    reg.add_argument("--runtime", default="eager", choices=MODEL_RUNTIMES)
+    reg.add_argument("--no-activate", action="store_true")
+    act = sub.add_parser("activate", help="Serve a registered version")
+    act.add_argument("version")
+    sub.add_parser("list", help="Show registered versions")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    if args.command == "register":
+        version = registry.register(args.path, args.runtime, activate=not args.no_activate)
+        print(f"Registered {version}" + ("" if args.no_activate else " (active)"))
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Active version: {args.version}")
+    else:
+        manifest = registry.manifest()
+        for version, entry in sorted(manifest.get("models", {}).items(),
+                                     key=lambda item: item[1]["registered_at"]):
+            marker = "*" if version == manifest.get("active") else " "
+            print(f"{marker} {version:28s} {entry['registered_at']}  {entry['file']}")
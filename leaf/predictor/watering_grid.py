@@ -0,0 +1,216 @@
+"""
+Watering Prediction Lookup Grid
+-------------------------------
+The watering model only sees two bounded inputs (light level, soil moisture),
+so `predict_watering_days` can be served from a table precomputed over a
+quantized grid of the input domain instead of walking 100 trees per call.
+
+Cells are right-closed intervals (lo + (i - 1) * step, lo + i * step] per
+axis, matching the trees' `x <= threshold` splits, plus one open cell below
+`lo` and one above `hi`. Each cell stores the exact model's prediction at its
+upper corner, which is the prediction for the whole cell as long as no split
+threshold falls strictly inside it.
+
+When the grid is built it is checked against the exact model on a validation
+sweep (random points plus every split threshold and its float32 neighbours).
+If any prediction differs the step is halved (up to `max_refinements` times);
+if it still differs the grid is not used and predictions stay exact.
+
+The table is saved next to `watering_model.pkl` (watering_model_grid.npy plus
+a .json sidecar with the grid parameters and the pickle's sha256) and loaded
+with a memory-mapped read.
+
+Enable with WATERING_GRID=1; WATERING_GRID_STEP and WATERING_GRID_LIGHT /
+WATERING_GRID_MOISTURE ("lo,hi") configure the grid.
+"""
+
+import json
+import math
+import os
+from typing import Optional
+
+import numpy as np
+
+# Defaults cover the model's training range and the raw values the API passes
+DEFAULT_STEP = 0.25
+DEFAULT_LIGHT_RANGE = (0.0, 100.0)
+DEFAULT_MOISTURE_RANGE = (0.0, 100.0)
+VALIDATION_POINTS = 100_000
+
+
+def _parse_range(value: Optional[str], default):
+    if not value:
+        return default
+    lo, hi = (float(part) for part in value.split(","))
+    return lo, hi
+
+
+def grid_settings_from_env() -> dict:
+    return {
+        "step": float(os.getenv("WATERING_GRID_STEP", DEFAULT_STEP)),
+        "light_range": _parse_range(os.getenv("WATERING_GRID_LIGHT"), DEFAULT_LIGHT_RANGE),
+        "moisture_range": _parse_range(os.getenv("WATERING_GRID_MOISTURE"), DEFAULT_MOISTURE_RANGE),
+    }
+
+
+class WateringGrid:
+    """Class table over (light, moisture) cells; lookups are O(1)."""
+
+    def __init__(self, table: np.ndarray, classes: np.ndarray, step: float, light_range, moisture_range,
+                 source_sha256: str = ""):
+        self.table = table                # (n_light + 2, n_moisture + 2) uint8 index into classes
+        self.classes = np.asarray(classes)
+        self.step = float(step)
+        self.light_lo, self.light_hi = (float(v) for v in light_range)
+        self.moisture_lo, self.moisture_hi = (float(v) for v in moisture_range)
+        self.source_sha256 = source_sha256
+        self._class_list = [int(c) for c in self.classes]
+        self._last_light = table.shape[0] - 1
+        self._last_moisture = table.shape[1] - 1
+
+    @staticmethod
+    def axis_points(lo: float, hi: float, step: float) -> np.ndarray:
+        """Representative (upper-corner) value of every cell along one axis."""
+        n = int(math.ceil((hi - lo) / step))
+        return np.concatenate([[lo], lo + np.arange(1, n + 1) * step, [lo + (n + 1) * step]])
+
+    @classmethod
+    def build(cls, forest, step: float, light_range, moisture_range, source_sha256: str = "") -> "WateringGrid":
+        light = cls.axis_points(*light_range, step)
+        moisture = cls.axis_points(*moisture_range, step)
+        corners = np.column_stack([np.repeat(light, len(moisture)), np.tile(moisture, len(light))])
+        class_index = {int(c): i for i, c in enumerate(forest.classes)}
+        predicted = forest.predict(corners)
+        table = np.array([class_index[int(c)] for c in predicted], dtype=np.uint8)
+        return cls(table.reshape(len(light), len(moisture)), forest.classes, step,
+                   light_range, moisture_range, source_sha256)
+
+    @staticmethod
+    def _cell(value: float, lo: float, step: float, last: int) -> int:
+        # The trees compare float32 inputs, so quantize the same value
+        i = math.ceil((float(np.float32(value)) - lo) / step)
+        return 0 if i < 0 else (last if i > last else i)
+
+    def predict_one(self, light_level: float, avg_moisture: float) -> int:
+        i = self._cell(light_level, self.light_lo, self.step, self._last_light)
+        j = self._cell(avg_moisture, self.moisture_lo, self.step, self._last_moisture)
+        return self._class_list[self.table[i, j]]
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32).reshape(-1, 2).astype(np.float64)
+        i = np.clip(np.ceil((X[:, 0] - self.light_lo) / self.step), 0, self._last_light).astype(np.intp)
+        j = np.clip(np.ceil((X[:, 1] - self.moisture_lo) / self.step), 0, self._last_moisture).astype(np.intp)
+        return self.classes.take(self.table[i, j])
+
+    def validation_sweep(self, forest, n_random: int = VALIDATION_POINTS, seed: int = 0) -> np.ndarray:
+        """Random points over (and just beyond) the domain plus every split threshold and its neighbours."""
+        rng = np.random.default_rng(seed)
+        margin = 2 * self.step
+        light = rng.uniform(self.light_lo - margin, self.light_hi + margin, n_random)
+        moisture = rng.uniform(self.moisture_lo - margin, self.moisture_hi + margin, n_random)
+
+        edges = []
+        for f, (lo, hi) in enumerate([(self.light_lo, self.light_hi), (self.moisture_lo, self.moisture_hi)]):
+            values = np.concatenate([forest.threshold[forest.feature == f], [lo, hi]]).astype(np.float32)
+            values = np.concatenate([values, np.nextafter(values, np.float32(-np.inf)),
+                                     np.nextafter(values, np.float32(np.inf))])
+            edges.append(np.unique(values).astype(np.float64))
+        other = rng.uniform(self.moisture_lo, self.moisture_hi, len(edges[0]))
+        light_edges = np.column_stack([edges[0], other])
+        other = rng.uniform(self.light_lo, self.light_hi, len(edges[1]))
+        moisture_edges = np.column_stack([other, edges[1]])
+        return np.vstack([np.column_stack([light, moisture]), light_edges, moisture_edges])
+
+    def mismatches(self, forest, X: Optional[np.ndarray] = None) -> int:
+        X = self.validation_sweep(forest) if X is None else X
+        return int(np.count_nonzero(self.predict(X) != forest.predict(X)))
+
+    def settings(self) -> dict:
+        return {"step": self.step, "light_range": [self.light_lo, self.light_hi],
+                "moisture_range": [self.moisture_lo, self.moisture_hi],
+                "source_sha256": self.source_sha256, "classes": self._class_list}
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.table)
+        os.replace(tmp_path, path)
+        with open(path + ".json.tmp", "w") as f:
+            json.dump(self.settings(), f)
+        os.replace(path + ".json.tmp", sidecar_path(path))
+
+    @classmethod
+    def load(cls, path: str) -> "WateringGrid":
+        with open(sidecar_path(path)) as f:
+            settings = json.load(f)
+        table = np.load(path, mmap_mode="r", allow_pickle=False)
+        return cls(table, np.array(settings["classes"]), settings["step"], settings["light_range"],
+                   settings["moisture_range"], settings["source_sha256"])
+
+
+def sidecar_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def load_or_build(forest, grid_path: str, step: float, light_range, moisture_range,
+                  max_refinements: int = 4) -> Optional[WateringGrid]:
+    """
+    Memory-map the saved grid if it matches the model and settings, otherwise
+    build and validate one (halving the step on mismatches) and save it.
+    Returns None if no validated grid could be built.
+    """
+    try:
+        grid = WateringGrid.load(grid_path)
+        if (grid.source_sha256 == forest.source_sha256 and grid.step <= step
+                and [grid.light_lo, grid.light_hi] == list(map(float, light_range))
+                and [grid.moisture_lo, grid.moisture_hi] == list(map(float, moisture_range))):
+            return grid
+    except (OSError, KeyError, ValueError):
+        pass
+
+    for _ in range(max_refinements + 1):
+        grid = WateringGrid.build(forest, step, light_range, moisture_range, forest.source_sha256)
+        mismatches = grid.mismatches(forest)
+        if mismatches == 0:
+            try:
+                grid.save(grid_path)
+            except OSError as e:
+                print("[Watering Model] Could not save lookup grid:", e)
+            return grid
+        print(f"[Watering Model] Lookup grid step {step} differs from the model on "
+              f"{mismatches} validation points, refining")
+        step /= 2
+    print("[Watering Model] No exact lookup grid found, using the compiled forest")
+    return None
+
+
+# Build + validation report and lookup benchmark (for testing only)
+if __name__ == "__main__":
+    import time
+
+    from leaf.predictor.watering_model import grid_path, get_watering_model
+
+    forest = get_watering_model()
+    settings = grid_settings_from_env()
+    for path in (grid_path, sidecar_path(grid_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+    start = time.perf_counter()
+    grid = load_or_build(forest, grid_path, **settings)
+    print(f"built in {time.perf_counter() - start:.2f}s")
+    if grid is None:
+        raise SystemExit(1)
+    print(f"step {grid.step}, table {grid.table.shape}, {grid.table.nbytes / 1024:.0f} KiB")
+
+    start = time.perf_counter()
+    grid = WateringGrid.load(grid_path)
+    print(f"memory-mapped load: {(time.perf_counter() - start) * 1000:.2f} ms")
+    print("mismatches on a fresh sweep:", grid.mismatches(forest, grid.validation_sweep(forest, seed=1)))
+
+    for name, fn, runs in [("compiled forest", lambda: forest.predict([[50.0, 50.0]]), 2000),
+                           ("lookup grid", lambda: grid.predict_one(50.0, 50.0), 200_000)]:
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        print(f"{name:15s}: {(time.perf_counter() - start) / runs * 1e6:8.2f} us per prediction")
@@ -1,11 +1,49 @@
-import joblib
 import numpy as np
-import pandas as pd
 import os
+import threading
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(CURRENT_DIR, "watering_model.pkl")
-model = joblib.load(model_path)
+# NumPy arrays compiled from the pickle (see compiled_forest.py), rebuilt when the pickle changes
+compiled_path = os.path.join(CURRENT_DIR, "watering_model_forest.npz")
+# Optional precomputed lookup table (see watering_grid.py), memory-mapped when loaded
+grid_path = os.path.join(CURRENT_DIR, "watering_model_grid.npy")
+WATERING_GRID = os.getenv("WATERING_GRID", "0") == "1"
+
+# Loaded on first prediction (or warmup): joblib/scikit-learn add ~1.5s to import time
+model = None
+grid = None
+_model_lock = threading.Lock()
+
+
+def get_watering_model():
+    """Load the compiled RandomForest once and return it (same predictions as the pickle)."""
+    global model, grid
+    if model is None:
+        with _model_lock:
+            if model is None:
+                from leaf.predictor.compiled_forest import load_or_compile
+                forest = load_or_compile(model_path, compiled_path)
+                if WATERING_GRID:
+                    from leaf.predictor.watering_grid import grid_settings_from_env, load_or_build
+                    grid = load_or_build(forest, grid_path, **grid_settings_from_env())
+                model = forest
+    return model
+
+
+def _predict_days(light_level: float, avg_moisture: float) -> int:
+    forest = get_watering_model()
+    if grid is not None:
+        return grid.predict_one(light_level, avg_moisture)
+    return int(forest.predict([[light_level, avg_moisture]])[0])
+
+
+def predict_watering_days_batch(light_levels, avg_moistures):
+    """Vectorized predict_watering_days: one watering interval per (light, moisture) pair."""
+    forest = get_watering_model()
+    X = np.column_stack([np.asarray(light_levels, dtype=np.float64), np.asarray(avg_moistures, dtype=np.float64)])
+    return (grid if grid is not None else forest).predict(X).astype(int)
+
 
 def predict_watering_days(light_level: float, avgMoisture: float) -> int:
     """
@@ -19,13 +57,7 @@ def predict_watering_days(light_level: float, avgMoisture: float) -> int:
     Returns:
     - int: Recommended watering interval in days (1, 3, or 7)
     """
-    features = np.array([[light_level, avgMoisture]])
-    prediction = model.predict(features)[0]
-    return int(prediction)
-def predict_watering_days(light_level, soil_moisture):
-    X = [[light_level, soil_moisture]]
-    prediction = model.predict(X)
-    return int(prediction[0])
+    return _predict_days(light_level, avgMoisture)
 # Example usage (for testing only, remove before deployment):
 if __name__ == "__main__":
     example_light = 2.5
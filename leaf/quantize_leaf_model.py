@@ -0,0 +1,156 @@
+"""
+Leaf Classifier INT8 Post-Training Quantization
+-----------------------------------------------
+Produces an int8 version of leaf_classifier_final_augmented.pth for CPU-only
+serving (LEAF_MODEL_RUNTIME=int8):
+
+1. Split leaf_dataset/ exactly like train_leaf_classifier_final_augmented.py
+   (80/20, random_state=42)
+2. Calibrate activation ranges on training-split images (FX graph mode,
+   static per-channel int8 quantization)
+3. Evaluate fp32 and int8 models on the validation split with the same
+   metrics evaluate_leaf_model.py writes to leaf_model_metrics.csv
+4. Publish leaf_classifier_final_augmented_int8.pt only if no metric drops
+   by more than --max-drop; the int8 report is saved as
+   leaf_model_metrics_int8.csv (same layout as leaf_model_metrics.csv)
+
+Usage:
+    python quantize_leaf_model.py [--data leaf_dataset] [--max-drop 0.01]
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+import torch
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+from torch.utils.data import DataLoader, Subset
+from torchvision import datasets
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from leaf.leaf_model import (
+    INT8_MODEL_PATH, LEAF_DIR, MODEL_PATH,
+    load_int8_model, load_leaf_model, select_quantized_engine, transform
+)
+
+DEFAULT_DATA_DIR = os.path.join(LEAF_DIR, "leaf_dataset")
+METRICS_PATH = os.path.join(LEAF_DIR, "leaf_model_metrics_int8.csv")
+
+# Metrics compared between fp32 and int8: (row, column) of the classification report
+GATED_METRICS = [
+    ("accuracy", "f1-score"),
+    ("macro avg", "f1-score"),
+    ("weighted avg", "f1-score"),
+    ("healthy", "recall"),
+    ("wilted", "recall"),
+]
+
+
+def build_loaders(data_dir: str, batch_size: int = 32):
+    """Calibration (train split) and evaluation (val split) loaders."""
+    dataset = datasets.ImageFolder(data_dir, transform=transform)
+    indices = list(range(len(dataset)))
+    train_idx, val_idx = train_test_split(indices, test_size=0.2, random_state=42, shuffle=True)
+
+    calib_loader = DataLoader(Subset(dataset, train_idx), batch_size=batch_size, shuffle=True,
+                              generator=torch.Generator().manual_seed(0))
+    eval_loader = DataLoader(Subset(dataset, val_idx), batch_size=batch_size)
+    return calib_loader, eval_loader, dataset.classes
+
+
+def quantize_model(model: torch.nn.Module, calib_loader, num_batches: int = 10) -> torch.nn.Module:
+    """Static int8 post-training quantization with FX graph mode."""
+    engine = select_quantized_engine()
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+    example = next(iter(calib_loader))[0][:1]
+
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(example,))
+    with torch.no_grad():
+        for i, (images, _) in enumerate(calib_loader):
+            if i >= num_batches:
+                break
+            prepared(images)
+    return convert_fx(prepared)
+
+
+def evaluate(model, loader, class_names) -> dict:
+    """classification_report (output_dict) on string labels, like evaluate_leaf_model.py."""
+    true_labels, pred_labels = [], []
+    with torch.no_grad():
+        for images, targets in loader:
+            preds = model(images).argmax(dim=1)
+            true_labels += [class_names[int(t)] for t in targets]
+            pred_labels += [class_names[int(p)] for p in preds]
+    return classification_report(true_labels, pred_labels, labels=class_names,
+                                 output_dict=True, zero_division=0)
+
+
+def metric_value(report: dict, row: str, column: str) -> float:
+    value = report.get(row, 0.0)
+    return float(value if row == "accuracy" else value.get(column, 0.0))
+
+
+def find_regressions(baseline: dict, candidate: dict, max_drop: float) -> list:
+    """List every gated metric where the candidate is worse than baseline by > max_drop."""
+    failures = []
+    for row, column in GATED_METRICS:
+        base = metric_value(baseline, row, column)
+        cand = metric_value(candidate, row, column)
+        if base - cand > max_drop:
+            failures.append(f"{row} {column}: {base:.4f} -> {cand:.4f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the leaf classifier to int8 with an accuracy gate.")
+    parser.add_argument("--weights", default=MODEL_PATH, help="fp32 state_dict (.pth)")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="ImageFolder dataset (healthy/, wilted/)")
+    parser.add_argument("--output", default=INT8_MODEL_PATH, help="int8 TorchScript output (.pt)")
+    parser.add_argument("--calib-batches", type=int, default=10, help="Batches used for calibration")
+    parser.add_argument("--max-drop", type=float, default=0.01, help="Max allowed drop per gated metric")
+    args = parser.parse_args()
+
+    calib_loader, eval_loader, class_names = build_loaders(args.data)
+
+    fp32_model = load_leaf_model(args.weights)
+    int8_model = quantize_model(load_leaf_model(args.weights), calib_loader, args.calib_batches)
+
+    # Export and evaluate the artifact exactly as the API will load it
+    example = next(iter(eval_loader))[0][:1]
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(int8_model, example).eval())
+    tmp_path = args.output + ".tmp"
+    torch.jit.save(scripted, tmp_path)
+    served = load_int8_model(tmp_path)
+
+    fp32_report = evaluate(fp32_model, eval_loader, class_names)
+    int8_report = evaluate(served, eval_loader, class_names)
+
+    report_df = pd.DataFrame(int8_report).transpose()
+    print("\nInt8 Classification Report:")
+    print(report_df)
+    report_df.to_csv(METRICS_PATH, index=True)
+
+    for row, column in GATED_METRICS:
+        print(f"- {row} {column}: fp32 {metric_value(fp32_report, row, column):.4f} | "
+              f"int8 {metric_value(int8_report, row, column):.4f}")
+
+    failures = find_regressions(fp32_report, int8_report, args.max_drop)
+    if failures:
+        os.remove(tmp_path)
+        print(f"\n[Quantize] Int8 model REJECTED (max drop {args.max_drop}):")
+        for failure in failures:
+            print("-", failure)
+        sys.exit(1)
+
+    os.replace(tmp_path, args.output)
+    print(f"\n[Quantize] Int8 model published to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Batch Leaf Scanning
+-------------------
+Helpers behind POST /leaf/scan_batch: greenhouse users scan dozens of plants
+in one session, so a single request may carry many images (as separate files
+or inside a .zip / .tar archive), each with its own light and moisture reading.
+
+All images go through the shared ScanPipeline concurrently, so the
+micro-batching engine runs them as full forward-pass batches. Results are
+streamed back as NDJSON, one line per image, in completion order.
+"""
+
+import asyncio
+import json
+import os
+import tarfile
+import zipfile
+from io import BytesIO
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from leaf.scoring.health_score import calculate_health_score
+
+MAX_BATCH_IMAGES = int(os.getenv("LEAF_SCAN_BATCH_MAX_IMAGES", "100"))
+MAX_IMAGE_BYTES = 25 * 1024 * 1024  # per image, also caps archive members
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+DEFAULT_LIGHT_LEVEL = 50.0
+DEFAULT_SOIL_MOISTURE = 50.0
+
+
+def expand_upload(filename: str, contents: bytes) -> List[Tuple[str, bytes]]:
+    """
+    Turn one uploaded file into (filename, image bytes) pairs.
+    Archives are unpacked (images only, in archive order); plain images pass through.
+    """
+    lower = (filename or "").lower()
+
+    if lower.endswith(".zip"):
+        images = []
+        with zipfile.ZipFile(BytesIO(contents)) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if info.file_size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"'{info.filename}' exceeds {MAX_IMAGE_BYTES} bytes.")
+                images.append((info.filename, archive.read(info)))
+                if len(images) > MAX_BATCH_IMAGES:
+                    break
+        return images
+
+    if lower.endswith(TAR_EXTENSIONS):
+        images = []
+        with tarfile.open(fileobj=BytesIO(contents), mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if member.size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"'{member.name}' exceeds {MAX_IMAGE_BYTES} bytes.")
+                images.append((member.name, archive.extractfile(member).read()))
+                if len(images) > MAX_BATCH_IMAGES:
+                    break
+        return images
+
+    return [(filename, contents)]
+
+
+def build_batch_items(uploads: List[Tuple[str, bytes]], light_levels: List[float],
+                      soil_moistures: List[float], metadata: Optional[str] = None) -> List[Dict]:
+    """
+    Expand uploads and attach per-image environment readings.
+
+    Readings are matched by position (after archive expansion); entries in the
+    optional `metadata` JSON ({"filename": {"light_level": .., "soil_moisture": ..}})
+    override them by filename. Missing readings default to 50.
+    """
+    per_file = json.loads(metadata) if metadata else {}
+    if not isinstance(per_file, dict):
+        raise ValueError("metadata must be a JSON object keyed by filename.")
+
+    images = []
+    for filename, contents in uploads:
+        images.extend(expand_upload(filename, contents))
+        if len(images) > MAX_BATCH_IMAGES:
+            raise ValueError(f"At most {MAX_BATCH_IMAGES} images per batch.")
+
+    items = []
+    for index, (filename, contents) in enumerate(images):
+        readings = per_file.get(filename) or per_file.get(os.path.basename(filename)) or {}
+        light = light_levels[index] if index < len(light_levels) else DEFAULT_LIGHT_LEVEL
+        moisture = soil_moistures[index] if index < len(soil_moistures) else DEFAULT_SOIL_MOISTURE
+        items.append({
+            "index": index,
+            "filename": filename,
+            "contents": contents,
+            "light_level": float(readings.get("light_level", light)),
+            "soil_moisture": float(readings.get("soil_moisture", moisture))
+        })
+    return items
+
+
+async def stream_scan_results(pipeline, items: List[Dict]) -> AsyncIterator[str]:
+    """
+    Score every item concurrently and yield one NDJSON line per image as soon
+    as it is ready. Each line is the calculate_health_score result plus
+    `index`, `filename` and `model_version`, or `index`, `filename` and
+    `error` on failure.
+    """
+    async def score(item):
+        try:
+            analysis = await pipeline.analyze(item["contents"])
+            result = calculate_health_score(
+                leaf_features=analysis["leaf_features"],
+                soil_moisture=item["soil_moisture"],
+                light_level=item["light_level"]
+            )
+            return {"index": item["index"], "filename": item["filename"], **result,
+                    "model_version": analysis["model_version"]}
+        except Exception as e:
+            return {"index": item["index"], "filename": item["filename"], "error": str(e)}
+
+    tasks = [asyncio.ensure_future(score(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # Client disconnected or stream closed early: stop remaining work
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,159 @@
+"""
+Content-Addressed Scan Result Cache
+-----------------------------------
+Users often re-upload the same leaf photo when they retry or refresh. The
+image-dependent part of a scan (model softmax + leaf features) only depends
+on the image bytes and the model that produced it, so it is cached under
+
+    sha256(model_version + image bytes)
+
+Environment-dependent parts (environment bonus, watering prediction, weather)
+are NOT cached; the API recomputes them from the cached image result.
+
+Tiers:
+- Memory: LRU with a fixed entry budget and TTL (entries are a few hundred bytes)
+- Disk (optional): JSON files shared by all workers on the host, same TTL
+
+Environment variables:
+- LEAF_SCAN_CACHE_SIZE: max in-memory entries (default 1024, 0 disables the cache)
+- LEAF_SCAN_CACHE_TTL:  entry lifetime in seconds (default 3600)
+- LEAF_SCAN_CACHE_DIR:  directory for the on-disk tier (default: disabled)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ScanCache:
+    """
+    Two-tier (memory LRU + optional disk) cache for image analysis results.
+
+    Thread-safe, so disk-tier lookups can run in an executor while the
+    event loop keeps using the memory tier.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 disk_dir: Optional[str] = None, name: str = "Scan Cache"):
+        self.name = name  # log prefix
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        # Metrics
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(contents: bytes, model_version: str) -> str:
+        digest = hashlib.sha256(model_version.encode("utf-8"))
+        digest.update(contents)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Look up a result in memory, then on disk. Returns None on miss/expiry."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.time() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.disk_dir:
+            stored = self._read_disk(key)
+            if stored is not None:
+                self._remember(key, stored["value"], stored["stored_at"])
+                self.disk_hits += 1
+                return stored["value"]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: dict):
+        """Store a JSON-serializable result in memory (and on disk if enabled)."""
+        if not self.enabled:
+            return
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        if self.disk_dir:
+            self._write_disk(key, {"stored_at": stored_at, "value": value})
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_tier": bool(self.disk_dir),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, value: dict, stored_at: float):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - stored.get("stored_at", 0) > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return stored
+
+    def _write_disk(self, key: str, stored: dict):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[{self.name}] Disk write failed:", e)
+
+
+def create_scan_cache() -> ScanCache:
+    """Build the scan cache configured from LEAF_SCAN_CACHE_* variables."""
+    return ScanCache(
+        max_entries=int(os.getenv("LEAF_SCAN_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.getenv("LEAF_SCAN_CACHE_TTL", "3600")),
+        disk_dir=os.getenv("LEAF_SCAN_CACHE_DIR") or None,
+    )
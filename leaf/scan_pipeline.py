@@ -0,0 +1,116 @@
+"""
+Leaf Scan Pipeline
+------------------
+Image-dependent half of /leaf/scan, shared by leaf_api.py and
+database/leaf_api.py:
+
+1. Scan cache lookup keyed by sha256(model version + image bytes)
+2. On a miss: decode + preprocess + colour features in the inference executor
+3. Micro-batched forward pass
+4. Store softmax + features in the cache
+
+Everything environment-dependent (environment bonus, watering prediction,
+weather) stays in the API and is recomputed on every request.
+"""
+
+import asyncio
+import copy
+
+import torch
+
+from leaf.executor import create_executor
+from leaf.inference import create_engine, prepare_scan
+from leaf.leaf_model import idx_to_label, model_version
+from leaf.scan_cache import ScanCache, create_scan_cache
+
+
+class ScanPipeline:
+    """Cache + executor + batching engine behind a single `analyze` call."""
+
+    def __init__(self, executor, engine, cache: ScanCache, version: str):
+        self.executor = executor
+        self.engine = engine
+        self.cache = cache
+        self.model_version = version
+        self.active_requests = 0  # analyze() calls still running on this pipeline
+
+    async def analyze(self, contents: bytes) -> dict:
+        """
+        Classify one uploaded image.
+
+        Returns:
+            dict: label, confidence, probs, leaf_features, cached, model_version
+        """
+        self.active_requests += 1
+        try:
+            return await self._analyze(contents)
+        finally:
+            self.active_requests -= 1
+
+    async def _analyze(self, contents: bytes) -> dict:
+        loop = asyncio.get_running_loop()
+        version = self.model_version
+        key = None
+
+        if self.cache.enabled:
+            key = await loop.run_in_executor(None, ScanCache.make_key, contents, version)
+            if self.cache.disk_dir:
+                cached = await loop.run_in_executor(None, self.cache.get, key)
+            else:
+                cached = self.cache.get(key)
+            if cached is not None:
+                return self._build_result(cached, version, cached=True)
+
+        input_tensor, leaf_features = await self.executor.run(prepare_scan, contents)
+        probs = await self.engine.submit(input_tensor)
+        value = {"probs": probs.tolist(), "leaf_features": leaf_features}
+
+        if key is not None:
+            if self.cache.disk_dir:
+                await loop.run_in_executor(None, self.cache.put, key, value)
+            else:
+                self.cache.put(key, value)
+
+        return self._build_result(value, version, cached=False)
+
+    def warm(self):
+        """Run one dummy batch through every worker (blocking)."""
+        self.executor.warm(torch.zeros(1, 3, 224, 224))
+
+    def close(self):
+        """Stop the batching task and release the pool once the pipeline is retired."""
+        self.engine.close()
+        self.executor.shutdown()
+
+    def metrics(self) -> dict:
+        return {
+            "model_version": self.model_version,
+            "executor": self.executor.metrics(),
+            "batching": self.engine.stats(),
+            "cache": self.cache.stats()
+        }
+
+    @staticmethod
+    def _build_result(value: dict, version: str, cached: bool) -> dict:
+        probs = value["probs"]
+        pred_idx = max(range(len(probs)), key=probs.__getitem__)
+        return {
+            "label": idx_to_label[pred_idx],
+            "confidence": probs[pred_idx],
+            "probs": list(probs),
+            "leaf_features": copy.deepcopy(value["leaf_features"]),
+            "cached": cached,
+            "model_version": version
+        }
+
+
+def create_scan_pipeline(runtime: str = None, model_path: str = None, version: str = None,
+                         cache: ScanCache = None) -> ScanPipeline:
+    """
+    Build executor, batching engine and cache from the environment.
+    `version` skips re-hashing the weights when the caller already knows it
+    (model registry); `cache` lets a replacement pipeline keep the old cache.
+    """
+    executor = create_executor(runtime, model_path)
+    return ScanPipeline(executor, create_engine(executor), cache or create_scan_cache(),
+                        version or model_version(runtime, model_path))
@@ -0,0 +1,220 @@
+"""
+Array-native counterparts of the scoring functions, for re-scoring history.
+
+Each function takes columns (NumPy arrays, lists or pandas Series; a pandas
+DataFrame or dict of columns for `calculate_health_score_batch`) and returns
+arrays that match the scalar functions element for element:
+
+- calculate_leaf_score_batch       -> calculate_leaf_score
+- calculate_environment_bonus_batch -> calculate_environment_bonus
+- calculate_health_score_batch     -> calculate_health_score
+
+Text outputs are returned as small integer codes; `decode_explanation` and
+`decode_recommendations` turn one row's codes back into the scalar lists.
+The messages are taken from the scalar modules, so the two never drift.
+
+Benchmark + exactness check (from the project root):
+    python -m leaf.scoring.batch_score
+"""
+
+from typing import Dict, List, Mapping
+
+import numpy as np
+
+from leaf.scoring.env_bonus import calculate_environment_bonus
+from leaf.scoring.health_score import generate_env_recommendations, generate_image_recommendations
+
+# evaluate_env_condition states
+STATUS_OPTIMAL, STATUS_LOW, STATUS_HIGH = 0, 1, 2
+STATUS_NAMES = np.array(["optimal", "low", "high"])
+
+LABELS = np.array(["Healthy", "Mild Wilt", "Health Warning"])
+
+# Recommendation bit flags, in the order calculate_health_score lists them
+REC_LIGHT_LOW = 1
+REC_LIGHT_HIGH = 2
+REC_MOISTURE_LOW = 4
+REC_MOISTURE_HIGH = 8
+REC_MILD_STRESS = 16
+REC_DAMAGE = 32
+
+# Feature columns; dotted names are what pandas.json_normalize produces from leaf_features
+FEATURE_COLUMNS = {
+    "yellow_ratio": ("yellow_ratio", "color.yellow_ratio"),
+    "brown": ("brown", "color.brown"),
+    "black_spot_ratio": ("black_spot_ratio", "color.black_spot_ratio"),
+    "irregularity": ("irregularity", "shape.irregularity"),
+    "holes_detected": ("holes_detected", "shape.holes_detected"),
+}
+
+# Readings on each side of the evaluate_env_condition thresholds, used to look up messages
+_LIGHT_READING = {STATUS_OPTIMAL: 50, STATUS_LOW: 0, STATUS_HIGH: 100}
+_MOISTURE_READING = {STATUS_OPTIMAL: 50, STATUS_LOW: 0, STATUS_HIGH: 100}
+
+
+def _column(values, default: float, n: int = None) -> np.ndarray:
+    """Float64 column; missing values (None / NaN) take the scalar functions' .get() default."""
+    if values is None:
+        return np.full(n, default, dtype=np.float64)
+    column = np.array(values, dtype=np.float64).reshape(-1)
+    column[np.isnan(column)] = default
+    return column
+
+
+def _round_like_python(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Element-wise round(x, ndigits). np.round scales by 10**ndigits before
+    rounding, which can land on the other side of a tie than Python's
+    correctly rounded decimal result; near-ties are redone with round().
+    (Matches the scalar functions for Python float inputs, as stored in the
+    logs; NumPy scalars make round() use NumPy's rounding instead.)
+    """
+    rounded = np.round(x, ndigits)
+    scaled = x * 10.0 ** ndigits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(float(v), ndigits) for v in x[near_tie]]
+    return rounded
+
+
+def calculate_leaf_score_batch(yellow_ratio, brown=None, black_spot_ratio=None,
+                               irregularity=None, holes_detected=None) -> np.ndarray:
+    """Leaf health scores (0.0 to 1.0) for columns of leaf features; see calculate_leaf_score."""
+    yellow_ratio = _column(yellow_ratio, 0)
+    n = len(yellow_ratio)
+    brown = _column(brown, 0, n)
+    black_spot_ratio = _column(black_spot_ratio, 0, n)
+    irregularity = _column(irregularity, 0, n)
+    holes = _column(holes_detected, 0, n) != 0
+
+    # Same operations in the same order as the scalar version
+    score = np.full(n, 1.0)
+    score -= yellow_ratio * 0.35
+    score -= np.minimum(brown / 100, 0.25)
+    score -= np.minimum(black_spot_ratio, 0.2)
+    score -= irregularity * 0.15
+    score[holes] -= 0.1
+    return _round_like_python(np.maximum(score, 0.0), 2)
+
+
+def evaluate_env_condition_batch(light_level, soil_moisture):
+    """(light_status, moisture_status) code arrays; see evaluate_env_condition."""
+    light_level = np.asarray(light_level, dtype=np.float64).reshape(-1)
+    soil_moisture = np.asarray(soil_moisture, dtype=np.float64).reshape(-1)
+    light = np.select([light_level < 30, light_level > 85], [STATUS_LOW, STATUS_HIGH], STATUS_OPTIMAL)
+    moisture = np.select([soil_moisture < 25, soil_moisture > 80], [STATUS_LOW, STATUS_HIGH], STATUS_OPTIMAL)
+    return light.astype(np.int8), moisture.astype(np.int8)
+
+
+def calculate_environment_bonus_batch(soil_moisture, light_level):
+    """
+    (bonus, light_status, moisture_status) arrays; see calculate_environment_bonus.
+    `decode_explanation(light_status[i], moisture_status[i])` gives the comments.
+    """
+    light, moisture = evaluate_env_condition_batch(light_level, soil_moisture)
+    bonus = (np.where(light == STATUS_OPTIMAL, 5, -5) + np.where(moisture == STATUS_OPTIMAL, 5, -5))
+    return bonus.astype(np.int64), light, moisture
+
+
+def calculate_health_score_batch(columns: Mapping, soil_moisture=None, light_level=None) -> Dict[str, np.ndarray]:
+    """
+    Health reports for many rows at once; see calculate_health_score.
+
+    `columns` is a pandas DataFrame or dict of columns holding the leaf features
+    (`yellow_ratio`, `brown`, `black_spot_ratio`, `irregularity`,
+    `holes_detected`, or their `color.` / `shape.` prefixed names) and, unless
+    passed separately, `soil_moisture` and `light_level`.
+
+    Returns arrays: health_score, label, image_score, env_bonus, light_status,
+    moisture_status and recommendation_codes (REC_* bit flags).
+    """
+    features = {}
+    for name, aliases in FEATURE_COLUMNS.items():
+        features[name] = next((columns[alias] for alias in aliases if alias in columns), None)
+    if features["yellow_ratio"] is None:
+        n = len(columns["soil_moisture"] if soil_moisture is None else soil_moisture)
+        features["yellow_ratio"] = np.zeros(n)
+
+    soil_moisture = columns["soil_moisture"] if soil_moisture is None else soil_moisture
+    light_level = columns["light_level"] if light_level is None else light_level
+
+    leaf_score = calculate_leaf_score_batch(**features)
+    image_score = np.rint(leaf_score * 100).astype(np.int64)  # round() on floats is half-to-even too
+    env_bonus, light, moisture = calculate_environment_bonus_batch(soil_moisture, light_level)
+
+    health_score = np.clip(image_score + env_bonus, 0, 100)
+    label = LABELS[np.select([health_score >= 85, health_score >= 60], [0, 1], 2)]
+
+    codes = (np.select([light == STATUS_LOW, light == STATUS_HIGH], [REC_LIGHT_LOW, REC_LIGHT_HIGH], 0)
+             | np.select([moisture == STATUS_LOW, moisture == STATUS_HIGH], [REC_MOISTURE_LOW, REC_MOISTURE_HIGH], 0)
+             | np.where(image_score < 85, REC_MILD_STRESS, 0)
+             | np.where(image_score < 60, REC_DAMAGE, 0))
+
+    return {
+        "health_score": health_score,
+        "label": label,
+        "image_score": image_score,
+        "env_bonus": env_bonus,
+        "light_status": light,
+        "moisture_status": moisture,
+        "recommendation_codes": codes.astype(np.int8),
+    }
+
+
+def decode_explanation(light_status: int, moisture_status: int) -> List[str]:
+    """calculate_environment_bonus comments for one row's status codes."""
+    return calculate_environment_bonus(_MOISTURE_READING[int(moisture_status)], _LIGHT_READING[int(light_status)])[1]
+
+
+def decode_recommendations(code: int) -> List[str]:
+    """calculate_health_score recommendations for one row's REC_* flags."""
+    code = int(code)
+    light = STATUS_LOW if code & REC_LIGHT_LOW else STATUS_HIGH if code & REC_LIGHT_HIGH else STATUS_OPTIMAL
+    moisture = (STATUS_LOW if code & REC_MOISTURE_LOW else
+                STATUS_HIGH if code & REC_MOISTURE_HIGH else STATUS_OPTIMAL)
+    image_score = 0 if code & REC_DAMAGE else 70 if code & REC_MILD_STRESS else 100
+    return (generate_env_recommendations(_LIGHT_READING[light], _MOISTURE_READING[moisture])
+            + generate_image_recommendations(image_score))
+
+
+# Benchmark + exactness check against the scalar functions (for testing only)
+if __name__ == "__main__":
+    import time
+
+    from leaf.scoring.health_score import calculate_health_score
+
+    rng = np.random.default_rng(0)
+    n = 200_000
+    columns = {
+        "yellow_ratio": rng.choice([0.0, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5], n) * rng.choice([1, 1, 0.7], n),
+        "brown": rng.integers(0, 100, n),
+        "black_spot_ratio": rng.uniform(0, 0.3, n).round(3),
+        "irregularity": rng.uniform(0, 1, n).round(2),
+        "holes_detected": rng.random(n) < 0.3,
+        "soil_moisture": rng.uniform(0, 100, n).round(1),
+        "light_level": rng.uniform(0, 100, n).round(1),
+    }
+    rows = [{"color": {"yellow_ratio": float(columns["yellow_ratio"][i]), "brown": int(columns["brown"][i]),
+                       "black_spot_ratio": float(columns["black_spot_ratio"][i])},
+             "shape": {"irregularity": float(columns["irregularity"][i]),
+                       "holes_detected": bool(columns["holes_detected"][i])}} for i in range(n)]
+    moisture = columns["soil_moisture"].tolist()
+    light = columns["light_level"].tolist()
+
+    start = time.perf_counter()
+    expected = [calculate_health_score(rows[i], moisture[i], light[i]) for i in range(n)]
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = calculate_health_score_batch(columns)
+    batch_s = time.perf_counter() - start
+
+    for i, report in enumerate(expected):
+        assert report["health_score"] == result["health_score"][i], i
+        assert report["label"] == result["label"][i], i
+        assert report["components"] == {"image_score": result["image_score"][i], "env_bonus": result["env_bonus"][i]}, i
+        assert report["explanation"] == decode_explanation(result["light_status"][i], result["moisture_status"][i]), i
+        assert report["recommendations"] == decode_recommendations(result["recommendation_codes"][i]), i
+    print(f"{n} rows identical to calculate_health_score")
+    print(f"scalar loop: {scalar_s * 1000:8.1f} ms | batch: {batch_s * 1000:6.1f} ms "
+          f"({scalar_s / batch_s:.0f}x)")
@@ -0,0 +1,64 @@
+"""
+Exactness tests: vectorized scoring vs the scalar leaf/scoring functions.
+Run from the project root:
+    python -m pytest leaf/test_batch_score.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from leaf.scoring.batch_score import (
+    calculate_environment_bonus_batch, calculate_health_score_batch, calculate_leaf_score_batch,
+    decode_explanation, decode_recommendations
+)
+from leaf.scoring.env_bonus import calculate_environment_bonus
+from leaf.scoring.feature_score import calculate_leaf_score
+from leaf.scoring.health_score import calculate_health_score
+
+
+def _features(n, seed=0):
+    # Two-decimal inputs, like the extractor's output, hit many rounding ties
+    rng = np.random.default_rng(seed)
+    return [{"color": {"yellow_ratio": float(rng.integers(0, 100)) / 100, "brown": int(rng.integers(0, 40)),
+                       "black_spot_ratio": float(rng.integers(0, 30)) / 100},
+             "shape": {"irregularity": float(rng.integers(0, 100)) / 100,
+                       "holes_detected": bool(rng.random() < 0.5)}} for _ in range(n)]
+
+
+def test_leaf_score_matches_scalar_rounding():
+    rows = _features(20_000)
+    frame = pd.json_normalize(rows)
+    got = calculate_leaf_score_batch(frame["color.yellow_ratio"], frame["color.brown"],
+                                     frame["color.black_spot_ratio"], frame["shape.irregularity"],
+                                     frame["shape.holes_detected"])
+    assert got.tolist() == [calculate_leaf_score(row) for row in rows]
+
+
+def test_environment_bonus_thresholds():
+    readings = [0, 24.9, 25, 29.9, 30, 50, 80, 80.1, 85, 85.1, 100]
+    moisture, light = np.meshgrid(readings, readings)
+    bonus, light_status, moisture_status = calculate_environment_bonus_batch(moisture.ravel(), light.ravel())
+    for i, (m, l) in enumerate(zip(moisture.ravel(), light.ravel())):
+        assert (bonus[i], decode_explanation(light_status[i], moisture_status[i])) == \
+            calculate_environment_bonus(float(m), float(l))
+
+
+def test_health_report_matches_scalar_with_missing_keys():
+    rows = _features(5_000, seed=1)
+    del rows[0]["shape"], rows[1]["color"]["brown"]
+    rng = np.random.default_rng(2)
+    moisture = rng.uniform(0, 100, len(rows)).round(1).tolist()
+    light = rng.uniform(0, 100, len(rows)).round(1).tolist()
+
+    frame = pd.json_normalize(rows).assign(soil_moisture=moisture, light_level=light)
+    result = calculate_health_score_batch(frame)
+
+    for i, row in enumerate(rows):
+        expected = calculate_health_score(row, moisture[i], light[i])
+        assert expected == {
+            "health_score": result["health_score"][i],
+            "label": result["label"][i],
+            "components": {"image_score": result["image_score"][i], "env_bonus": result["env_bonus"][i]},
+            "explanation": decode_explanation(result["light_status"][i], result["moisture_status"][i]),
+            "recommendations": decode_recommendations(result["recommendation_codes"][i]),
+        }
@@ -0,0 +1,93 @@
+"""
+Parity tests: fused tensor feature extractor vs the PIL reference.
+
+Run from the project root:
+    python -m pytest leaf/test_leaf_features.py
+"""
+
+import numpy as np
+from PIL import Image
+
+from leaf.leaf_features import (
+    BLACK_SPOT_MAX_VALUE, _hue_saturation_value,
+    extract_leaf_features, extract_leaf_features_from_tensor
+)
+from leaf.leaf_model import transform
+from leaf.scoring.feature_score import calculate_leaf_score
+
+
+def _sample_images():
+    rng = np.random.default_rng(7)
+    images = [Image.fromarray(rng.integers(0, 256, (300, 400, 3), dtype=np.uint8))]
+    # Solid colours around the yellow/brown hue boundaries, plus grey and black
+    for rgb in [(200, 180, 40), (160, 80, 30), (150, 90, 30), (90, 160, 60), (128, 128, 128), (10, 12, 8)]:
+        images.append(Image.new("RGB", (240, 240), rgb))
+    return images
+
+
+def test_hsv_matches_pil_on_colour_grid():
+    axis = np.arange(0, 256, 5)
+    grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), -1).reshape(1, -1, 3).astype(np.uint8)
+    expected = np.array(Image.fromarray(grid).convert("HSV"))
+
+    hue, sat, value = _hue_saturation_value(grid.transpose(2, 0, 1).astype(np.float32))
+
+    assert (hue == expected[:, :, 0]).all()
+    assert (sat == expected[:, :, 1]).all()
+    assert (value == expected[:, :, 2]).all()
+
+
+def test_matches_reference_on_model_resolution():
+    for img in _sample_images():
+        tensor = transform(img)
+        resized = img.resize((224, 224), Image.BILINEAR)
+
+        reference = extract_leaf_features(resized)
+        fused = extract_leaf_features_from_tensor(tensor)
+
+        assert fused["color"]["yellow_ratio"] == reference["color"]["yellow_ratio"]
+        assert fused["color"]["brown"] == reference["color"]["brown"]
+        assert fused["shape"] == reference["shape"]
+
+
+def test_black_spot_ratio_matches_hsv_value():
+    for img in _sample_images():
+        resized = img.resize((224, 224), Image.BILINEAR)
+        value = np.array(resized.convert("HSV"))[:, :, 2]
+        expected = round(float((value < BLACK_SPOT_MAX_VALUE).mean()), 2)
+
+        features = extract_leaf_features_from_tensor(transform(img), black_spots=True)
+        assert features["color"]["black_spot_ratio"] == expected
+
+
+def test_dark_background_scores_like_reference():
+    # A green leaf on a black background: by default the background must not
+    # count as black spots, so the score matches the PIL reference extractor
+    img = Image.new("RGB", (400, 300), (8, 8, 8))
+    img.paste((90, 160, 60), (120, 80, 280, 220))
+    tensor = transform(img)
+    reference = extract_leaf_features(img.resize((224, 224), Image.BILINEAR))
+
+    fused = extract_leaf_features_from_tensor(tensor)
+    assert "black_spot_ratio" not in fused["color"]
+    assert calculate_leaf_score(fused) == calculate_leaf_score(reference)
+
+    flagged = extract_leaf_features_from_tensor(tensor, black_spots=True)
+    assert flagged["color"]["black_spot_ratio"] > 0.5
+    assert calculate_leaf_score(flagged) < calculate_leaf_score(reference)
+
+
+def test_brown_count_scaled_to_source_pixels():
+    img = Image.new("RGB", (224, 224), (160, 80, 30))  # PIL hue 16: brown
+    features = extract_leaf_features_from_tensor(transform(img), pixel_scale=4.0)
+
+    assert features["color"]["brown"] == 224 * 224 * 4
+
+
+if __name__ == "__main__":
+    test_hsv_matches_pil_on_colour_grid()
+    test_matches_reference_on_model_resolution()
+    test_black_spot_ratio_matches_hsv_value()
+    test_dark_background_scores_like_reference()
+    test_brown_count_scaled_to_source_pixels()
+    print("All leaf feature parity tests passed.")
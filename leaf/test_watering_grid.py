@@ -0,0 +1,70 @@
+"""
+Compiled watering forest and lookup grid tests against the pickled model.
+Run from the project root:
+    python -m pytest leaf/test_watering_grid.py
+"""
+
+import warnings
+
+import joblib
+import numpy as np
+import pytest
+
+from leaf.predictor import watering_model
+from leaf.predictor.compiled_forest import CompiledForest, file_sha256
+from leaf.predictor.watering_grid import WateringGrid, load_or_build
+
+
+@pytest.fixture(scope="module")
+def sklearn_model():
+    return joblib.load(watering_model.model_path)
+
+
+@pytest.fixture(scope="module")
+def forest(sklearn_model):
+    return CompiledForest.from_sklearn(sklearn_model, file_sha256(watering_model.model_path))
+
+
+def test_compiled_forest_matches_sklearn(sklearn_model, forest):
+    rng = np.random.default_rng(3)
+    X = np.column_stack([rng.uniform(0, 4, 5000), rng.uniform(0, 4, 5000)])
+    X[:3] = [[50.0, 50.0], [1.25, 2.75], [np.nan, 2.0]]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert np.array_equal(forest.predict_proba(X), sklearn_model.predict_proba(X))
+        assert np.array_equal(forest.predict(X), sklearn_model.predict(X))
+
+
+def test_threshold_cells_match_sklearn_at_split_edges(sklearn_model, forest):
+    # Every cut point and its float32 neighbours, crossed over both features
+    values = np.concatenate([np.concatenate([cuts, np.nextafter(cuts.astype(np.float32), -np.inf),
+                                             np.nextafter(cuts.astype(np.float32), np.inf)])
+                             for cuts in forest._cut_points] + [[-1.0, 0.0, 50.0, 1e6]])
+    X = np.array(np.meshgrid(values, values)).reshape(2, -1).T
+    assert forest._cells(forest._as_rows(X)) is not None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert np.array_equal(forest.predict_proba(X), sklearn_model.predict_proba(X))
+        assert np.array_equal(forest.predict(X), sklearn_model.predict(X))
+
+
+def test_grid_is_exact_and_memory_mapped(forest, tmp_path):
+    path = str(tmp_path / "grid.npy")
+    grid = load_or_build(forest, path, 0.25, (0.0, 10.0), (0.0, 10.0))
+    assert grid is not None and grid.mismatches(forest) == 0
+    assert grid.predict_one(50.0, 50.0) == int(forest.predict([[50.0, 50.0]])[0])
+
+    loaded = WateringGrid.load(path)
+    assert isinstance(loaded.table, np.memmap)
+    assert np.array_equal(loaded.table, grid.table)
+
+
+def test_grid_refines_coarse_step(forest, tmp_path):
+    grid = load_or_build(forest, str(tmp_path / "grid.npy"), 1.0, (0.0, 10.0), (0.0, 10.0))
+    assert grid.step == 0.25
+
+
+def test_grid_rejected_when_never_exact(forest, tmp_path):
+    # 0.3 / 2^k never lines up with the 0.25-spaced split thresholds
+    assert load_or_build(forest, str(tmp_path / "grid.npy"), 0.3, (0.0, 10.0), (0.0, 10.0),
+                         max_refinements=1) is None
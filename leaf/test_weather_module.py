@@ -0,0 +1,198 @@
+"""
+Weather forecast cache tests against a local stand-in for Open-Meteo.
+Run from the project root:
+    python -m pytest leaf/test_weather_module.py
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from leaf import weather_module
+from leaf.scan_cache import ScanCache
+
+
+class StandInForecastServer:
+    """Serves {"hourly": {"precipitation": [...]}} and records every request."""
+
+    def __init__(self, precipitation):
+        self.precipitation = precipitation
+        self.delay = 0.0
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append({k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()})
+                time.sleep(server.delay)
+                body = json.dumps({"hourly": {"precipitation": server.precipitation}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1/forecast"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def forecast_server(monkeypatch, tmp_path):
+    server = StandInForecastServer([0.0, 0.2, 1.4])
+    monkeypatch.setattr(weather_module, "WEATHER_API_URL", server.url)
+    monkeypatch.setattr(weather_module, "forecast_cache", ScanCache(64, 7200, str(tmp_path)))
+    yield server
+    server.close()
+
+
+def test_nearby_locations_share_one_fetch(forecast_server):
+    assert weather_module.should_delay_watering(51.5074, -0.1278) == "Rain is expected later today. Watering delayed."
+    assert weather_module.should_delay_watering(51.5121, -0.1302) != ""  # same 0.1° cell
+    assert len(forecast_server.requests) == 1
+    assert forecast_server.requests[0]["latitude"] == "51.5"
+
+    weather_module.should_delay_watering(48.8566, 2.3522)  # different cell
+    assert len(forecast_server.requests) == 2
+
+
+def test_dry_forecast_does_not_delay(forecast_server):
+    forecast_server.precipitation = [0.0, 0.1, 0.5]
+    assert weather_module.should_delay_watering(40.0, -3.7) == ""
+
+
+def test_refresher_prefetches_user_cells(forecast_server):
+    locations = [{"lat": 51.5074, "lon": -0.1278}, {"lat": 51.51, "lon": -0.13}, {"lat": 55.95, "lon": -3.19}, {}]
+    refresher = weather_module.ForecastRefresher(lambda: locations)
+
+    assert refresher.refresh_once() == {"cells": 2, "fetched": 2, "fresh": 0, "failed": 0}
+    assert refresher.refresh_once()["fresh"] == 2
+
+    weather_module.should_delay_watering(55.95, -3.19)
+    assert len(forecast_server.requests) == 2  # served from the prefetched cell
+
+
+def test_disk_tier_is_shared_between_workers(forecast_server, monkeypatch, tmp_path):
+    weather_module.should_delay_watering(51.5074, -0.1278)
+
+    # A second worker process starts with an empty memory tier on the same directory
+    monkeypatch.setattr(weather_module, "forecast_cache", ScanCache(64, 7200, str(tmp_path)))
+    weather_module.should_delay_watering(51.5074, -0.1278)
+    assert len(forecast_server.requests) == 1
+
+
+def _freeze_clock(monkeypatch, now):
+    class FrozenDatetime(weather_module.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(weather_module, "datetime", FrozenDatetime)
+
+
+def _cache_previous_hour(now, precipitation):
+    cell = weather_module.grid_cell(51.5074, -0.1278)
+    previous_hour = weather_module.forecast_hour(now - weather_module.timedelta(hours=1))
+    weather_module.forecast_cache.put(weather_module.cell_key(cell, previous_hour),
+                                      {"precipitation": precipitation, "fetched_at": 0})
+
+
+def test_provider_failure_falls_back_to_previous_hour(forecast_server, monkeypatch):
+    now = weather_module.datetime(2025, 6, 1, 14, 30, tzinfo=weather_module.timezone.utc)
+    _freeze_clock(monkeypatch, now)
+    _cache_previous_hour(now, [2.0])
+
+    monkeypatch.setattr(weather_module, "WEATHER_API_URL", "http://127.0.0.1:9/unreachable")
+    assert weather_module.should_delay_watering(51.5074, -0.1278) != ""
+
+
+def test_no_fallback_to_previous_day(forecast_server, monkeypatch):
+    # Just after UTC midnight the previous hour's forecast describes yesterday
+    now = weather_module.datetime(2025, 6, 2, 0, 10, tzinfo=weather_module.timezone.utc)
+    _freeze_clock(monkeypatch, now)
+    _cache_previous_hour(now, [2.0])
+    cell = weather_module.grid_cell(51.5074, -0.1278)
+    assert weather_module.lookup_forecast(cell, now) == (None, None)
+
+    monkeypatch.setattr(weather_module, "WEATHER_API_URL", "http://127.0.0.1:9/unreachable")
+    assert weather_module.should_delay_watering(51.5074, -0.1278) == ""
+
+
+def test_async_client_single_flight(forecast_server):
+    client = weather_module.AsyncWeatherClient()
+    forecast_server.delay = 0.2
+
+    async def scenario():
+        results = await asyncio.gather(*[client.should_delay_watering(51.5074, -0.1278) for _ in range(10)])
+        await client.close()
+        return results
+
+    assert set(asyncio.run(scenario())) == {"Rain is expected later today. Watering delayed."}
+    assert len(forecast_server.requests) == 1
+    assert client.metrics()["shared_waits"] == 9
+
+
+def test_async_client_respects_deadline(forecast_server):
+    client = weather_module.AsyncWeatherClient()
+    forecast_server.delay = 0.5
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        note = await client.should_delay_watering(51.5074, -0.1278, deadline=start + 0.1)
+        waited = loop.time() - start
+        await asyncio.sleep(0.6)  # the shared fetch finishes in the background and fills the cache
+        cached = await client.should_delay_watering(51.5074, -0.1278, deadline=loop.time())
+        await client.close()
+        return note, waited, cached
+
+    note, waited, cached = asyncio.run(scenario())
+    assert note == "" and waited < 0.3
+    assert cached != ""
+    assert len(forecast_server.requests) == 1
+
+
+def test_circuit_breaker_skips_slow_provider(forecast_server):
+    breaker = weather_module.CircuitBreaker(failure_threshold=2, reset_seconds=60, slow_call_seconds=0.05)
+    client = weather_module.AsyncWeatherClient(breaker)
+    forecast_server.delay = 0.1
+
+    async def scenario():
+        for lat in (10.0, 20.0, 30.0, 40.0):  # distinct cells, all slow
+            await client.get_forecast(lat, 0.0)
+        await client.close()
+
+    asyncio.run(scenario())
+    assert breaker.state == "open"
+    assert len(forecast_server.requests) == 2
+    assert client.metrics()["breaker_skips"] == 2
+
+
+def test_cancelled_trial_does_not_wedge_breaker(forecast_server):
+    breaker = weather_module.CircuitBreaker(failure_threshold=1, reset_seconds=0, slow_call_seconds=5)
+    breaker.record(False)  # open; reset_seconds=0 makes the next call the half-open trial
+    client = weather_module.AsyncWeatherClient(breaker)
+    forecast_server.delay = 0.5
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        await client.get_forecast(60.0, 0.0, deadline=loop.time() + 0.05)
+        for task in list(client._in_flight.values()):  # e.g. shutdown cancels the trial
+            task.cancel()
+        await asyncio.sleep(0)
+        await client.close()
+
+    asyncio.run(scenario())
+    assert breaker.allow()
@@ -1,35 +1,407 @@
+"""
+Weather-Based Watering Delay
+----------------------------
+`should_delay_watering` delays watering when Open-Meteo forecasts rain today.
+
+Forecasts are cached per grid cell (lat/lon rounded to WEATHER_CELL_DEGREES,
+default 0.1° ≈ 11 km) and UTC forecast hour, so all users in a cell share one
+upstream call per hour. The cache reuses the scan cache's two tiers: an
+in-process LRU with TTL and an optional JSON disk tier (WEATHER_CACHE_DIR)
+shared by all workers on the host.
+
+ForecastRefresher prefetches the cells covering every user's `location` in
+the background, so scans normally find a fresh cell and never wait on the
+network. The routes use `weather_client` (AsyncWeatherClient): pooled async
+HTTP, deadline-bounded, single-flight per cell, behind a circuit breaker.
+
+Environment variables:
+- WEATHER_API_URL:      forecast endpoint (default Open-Meteo; point it at a
+                        local stand-in server for tests)
+- WEATHER_CELL_DEGREES: grid cell size in degrees (default 0.1)
+- WEATHER_CACHE_SIZE:   in-memory cells (default 4096)
+- WEATHER_CACHE_TTL:    entry lifetime in seconds (default 7200, so the
+                        previous hour stays available as a fallback)
+- WEATHER_CACHE_DIR:    directory for the on-disk tier (default: disabled)
+- WEATHER_MAX_AGE:      seconds a previous-hour forecast still counts as
+                        fresh (default 3600)
+- WEATHER_SLOW_CALL_MS, WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_RESET_SECONDS:
+                        circuit breaker tuning (default 1000 ms, 3, 30 s)
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import httpx
 import requests
 
+from leaf.scan_cache import ScanCache
+
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+CELL_DEGREES = float(os.getenv("WEATHER_CELL_DEGREES", "0.1"))
+MAX_AGE_SECONDS = float(os.getenv("WEATHER_MAX_AGE", "3600"))
+FETCH_TIMEOUT_SECONDS = 8
+RAIN_THRESHOLD_MM = 0.5
+
+forecast_cache = ScanCache(
+    max_entries=int(os.getenv("WEATHER_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("WEATHER_CACHE_TTL", "7200")),
+    disk_dir=os.getenv("WEATHER_CACHE_DIR") or None,
+    name="Weather Cache",
+)
+
+
+def grid_cell(lat: float, lon: float) -> Tuple[float, float]:
+    """Snap coordinates to the centre of their grid cell."""
+    return (round(round(float(lat) / CELL_DEGREES) * CELL_DEGREES, 4),
+            round(round(float(lon) / CELL_DEGREES) * CELL_DEGREES, 4))
+
+
+def forecast_hour(now: datetime = None) -> str:
+    """UTC hour bucket, e.g. "2025-06-01T14"."""
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H")
+
+
+def cell_key(cell: Tuple[float, float], hour: str) -> str:
+    return f"weather_{cell[0]}_{cell[1]}_{hour}"
+
+
+def forecast_params(lat: float, lon: float) -> Dict:
+    return {"latitude": lat, "longitude": lon, "hourly": "precipitation", "forecast_days": 1}
+
+
+def parse_forecast(data: Dict) -> Dict:
+    """Keep only what the watering decision needs from the provider's JSON."""
+    return {"precipitation": data.get("hourly", {}).get("precipitation", []), "fetched_at": time.time()}
+
+
+def fetch_forecast(lat: float, lon: float, timeout: float = FETCH_TIMEOUT_SECONDS) -> Dict:
+    """Fetch today's hourly precipitation for one point from the provider (blocking)."""
+    response = requests.get(WEATHER_API_URL, params=forecast_params(lat, lon), timeout=timeout)
+    response.raise_for_status()
+    return parse_forecast(response.json())
+
+
+def lookup_forecast(cell: Tuple[float, float], now: datetime) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """
+    Cache-only lookup. Returns (fresh, previous):
+    - fresh: this hour's entry, or the previous hour's entry if fetched less
+      than WEATHER_MAX_AGE ago (covers the gap until the refresher fetches
+      the new hour); None if the cell needs fetching
+    - previous: the previous hour's entry within the TTL, used as a fallback
+      when the provider fails
+
+    The previous hour only counts on the same UTC day: forecasts cover one
+    day, so after midnight it would describe yesterday's rain.
+    """
+    forecast = forecast_cache.get(cell_key(cell, forecast_hour(now)))
+    if forecast is not None:
+        return forecast, forecast
+
+    previous_hour = now - timedelta(hours=1)
+    if previous_hour.date() != now.date():
+        return None, None
+    previous = forecast_cache.get(cell_key(cell, forecast_hour(previous_hour)))
+    if previous is not None and time.time() - previous.get("fetched_at", 0) <= MAX_AGE_SECONDS:
+        return previous, previous
+    return None, previous
+
+
+def get_forecast(lat: float, lon: float) -> Optional[Dict]:
+    """
+    Forecast for the cell containing (lat, lon): from the cache when fresh,
+    otherwise fetched (blocking) and cached. Falls back to the previous
+    hour's entry if the provider fails.
+    """
+    cell = grid_cell(lat, lon)
+    now = datetime.now(timezone.utc)
+    forecast, previous = lookup_forecast(cell, now)
+    if forecast is not None:
+        return forecast
+
+    try:
+        forecast = fetch_forecast(*cell)
+    except Exception as e:
+        print("[Weather Module] Fetch failed:", e)
+        return previous
+
+    forecast_cache.put(cell_key(cell, forecast_hour(now)), forecast)
+    return forecast
+
+
+def delay_message(forecast: Optional[Dict]) -> str:
+    """Watering delay note for a cached forecast ("" = no delay)."""
+    rain_values = forecast.get("precipitation", []) if forecast else []
+
+    if not rain_values:
+        print("[Weather Module] Warning: No precipitation data found")
+        return ""
+
+    max_rain = max(rain_values)
+
+    if max_rain > RAIN_THRESHOLD_MM:
+        return "Rain is expected later today. Watering delayed."
+    else:
+        return ""
+
 
 def should_delay_watering(lat: float, lon: float) -> str:
     try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast?"
-            f"latitude={lat}&longitude={lon}&hourly=precipitation&forecast_days=1"
+        return delay_message(get_forecast(lat, lon))
+    except Exception as e:
+        print("[Weather Module] Error:", e)
+        return ""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a slow or failing provider for a while.
+
+    closed:    calls allowed; `failure_threshold` consecutive failures or slow
+               calls (> slow_call_seconds) open the circuit
+    open:      calls skipped for `reset_seconds`
+    half_open: one trial call; success closes, failure re-opens, a
+               cancelled trial frees the slot for the next call
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30.0,
+                 slow_call_seconds: float = 1.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._trial_running:
+                return False
+            self._trial_running = True
+        return True
+
+    def release_trial(self):
+        """The trial call ended without a result (e.g. cancelled)."""
+        self._trial_running = False
+
+    def record(self, ok: bool, elapsed: float = 0.0):
+        self._trial_running = False
+        if ok and elapsed <= self.slow_call_seconds:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def metrics(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class AsyncWeatherClient:
+    """
+    Non-blocking forecast lookups for the API routes.
+
+    - One pooled keep-alive httpx.AsyncClient per event loop
+    - Deadline-bounded: callers pass an absolute loop-time deadline derived
+      from the route's latency budget; past it the weather adjustment is
+      skipped (cached/previous forecast or "")
+    - Single-flight: concurrent lookups of the same cell share one fetch,
+      which keeps running (and fills the cache) if a caller gives up
+    - Circuit breaker: a slow or failing provider is skipped for a while
+    """
+
+    def __init__(self, breaker: CircuitBreaker = None, max_connections: int = 20):
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("WEATHER_BREAKER_FAILURES", "3")),
+            reset_seconds=float(os.getenv("WEATHER_BREAKER_RESET_SECONDS", "30")),
+            slow_call_seconds=float(os.getenv("WEATHER_SLOW_CALL_MS", "1000")) / 1000,
         )
-        print("[DEBUG] URL:", url)
+        self.max_connections = max_connections
+        self._client = None
+        self._loop = None
+        self._in_flight = {}  # cache key -> asyncio.Task
 
-        response = requests.get(url, timeout=8)
-        data = response.json()
-        print("[DEBUG] Full JSON:", data)
+        # Metrics
+        self.fetches = 0
+        self.shared_waits = 0
+        self.deadline_skips = 0
+        self.breaker_skips = 0
 
-        rain_values = data.get("hourly", {}).get("precipitation", [])
+    async def get_forecast(self, lat: float, lon: float, deadline: float = None) -> Optional[Dict]:
+        """Forecast for (lat, lon) without waiting past `deadline` (loop time)."""
+        loop = asyncio.get_running_loop()
+        cell = grid_cell(lat, lon)
+        now = datetime.now(timezone.utc)
+        if forecast_cache.disk_dir:
+            forecast, previous = await loop.run_in_executor(None, lookup_forecast, cell, now)
+        else:
+            forecast, previous = lookup_forecast(cell, now)
+        if forecast is not None:
+            return forecast
 
-        if not rain_values:
-            print("[Weather Module] Warning: No precipitation data found")
+        key = cell_key(cell, forecast_hour(now))
+        task = self._in_flight.get(key)
+        if task is None:
+            if not self.breaker.allow():
+                self.breaker_skips += 1
+                return previous
+            task = loop.create_task(self._fetch(cell, key))
+            task.add_done_callback(functools.partial(self._forget, key))
+            self._in_flight[key] = task
+        else:
+            self.shared_waits += 1
+
+        timeout = FETCH_TIMEOUT_SECONDS if deadline is None else deadline - loop.time()
+        if timeout <= 0:
+            self.deadline_skips += 1
+            return previous
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.deadline_skips += 1
+            return previous
+        except Exception as e:
+            print("[Weather Module] Fetch failed:", e)
+            return previous
+
+    async def should_delay_watering(self, lat: float, lon: float, deadline: float = None) -> str:
+        try:
+            return delay_message(await self.get_forecast(lat, lon, deadline))
+        except Exception as e:
+            print("[Weather Module] Error:", e)
             return ""
 
-        max_rain = max(rain_values)
-        print("[DEBUG] Max precipitation today:", max_rain)
+    def metrics(self) -> Dict:
+        return {
+            "fetches": self.fetches,
+            "in_flight": len(self._in_flight),
+            "shared_waits": self.shared_waits,
+            "deadline_skips": self.deadline_skips,
+            "breaker_skips": self.breaker_skips,
+            "breaker": self.breaker.metrics(),
+            "cache": forecast_cache.stats(),
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-        if max_rain > 0.5:
-            return "Rain is expected later today. Watering delayed."
+    async def _fetch(self, cell: Tuple[float, float], key: str) -> Dict:
+        loop = asyncio.get_running_loop()
+        self.fetches += 1
+        start = loop.time()
+        try:
+            response = await self._get_client().get(WEATHER_API_URL, params=forecast_params(*cell))
+            response.raise_for_status()
+            forecast = parse_forecast(response.json())
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(True, loop.time() - start)
+
+        if forecast_cache.disk_dir:
+            await loop.run_in_executor(None, forecast_cache.put, key, forecast)
         else:
-            return ""
+            forecast_cache.put(key, forecast)
+        return forecast
 
-    except Exception as e:
-        print("[Weather Module] Error:", e)
-        return ""
+    def _forget(self, key: str, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if task.cancelled():
+            # Cancelled at shutdown or with its loop: no record() ran
+            self.breaker.release_trial()
+        else:
+            task.exception()  # mark as retrieved; callers already handled it
+
+    def _get_client(self):
+        # httpx clients are bound to the loop they were first used on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=FETCH_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+
+# Shared by the API routes
+weather_client = AsyncWeatherClient()
+
+
+class ForecastRefresher:
+    """
+    Background thread that keeps the cells covering all user locations fresh.
+
+    `locations_fn` returns an iterable of {"lat": .., "lon": ..} dicts
+    (e.g. database.user_db_manager.list_user_locations).
+    """
+
+    def __init__(self, locations_fn: Callable[[], Iterable[Dict]], interval_seconds: float = 600):
+        self.locations_fn = locations_fn
+        self.interval = float(interval_seconds)
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh_once(self) -> Dict:
+        """Fetch every covered cell missing this hour's forecast. Returns counters."""
+        cells = set()
+        for location in self.locations_fn():
+            if location and location.get("lat") is not None and location.get("lon") is not None:
+                cells.add(grid_cell(location["lat"], location["lon"]))
+
+        hour = forecast_hour()
+        stats = {"cells": len(cells), "fetched": 0, "fresh": 0, "failed": 0}
+        for cell in cells:
+            key = cell_key(cell, hour)
+            if forecast_cache.get(key) is not None:
+                stats["fresh"] += 1
+                continue
+            try:
+                forecast_cache.put(key, fetch_forecast(*cell))
+                stats["fetched"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[Weather Refresher] Cell {cell} failed:", e)
+
+        self.last_run = dict(stats, finished_at=time.time())
+        return stats
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="weather-refresher")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                print("[Weather Refresher]", self.refresh_once())
+            except Exception as e:
+                print("[Weather Refresher] Error:", e)
+            self._stop.wait(self.interval)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, Form
-from fastapi.responses import JSONResponse
-from typing import Dict
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List
 from io import BytesIO
 from PIL import Image
-import torch
-import torchvision.transforms as transforms
 import sys
 import os
 import numpy as np
@@ -16,72 +15,17 @@ sys.path.append(PROJECT_ROOT)
 # Import score computation and environment bonus logic
 from leaf.scoring.health_score import calculate_health_score
 from leaf.scoring.env_bonus import calculate_environment_bonus
-
-MODEL_PATH = os.path.join(os.getcwd(), "leaf", "leaf_classifier_final_augmented.pth")
+from leaf.lazy_pipeline import LazyScanPipeline
+from leaf.scan_batch import build_batch_items, stream_scan_results
 
 # Initialize FastAPI router
 router = APIRouter(prefix="/leaf", tags=["Leaf Scan"])
 
-from torchvision import models
-
-# Initialize ResNet18 model (no pretrained weights)
-model = models.resnet18(pretrained=False)
-
-# Adjust the final layer for 2-class classification
-model.fc = torch.nn.Linear(model.fc.in_features, 2)
-
-# Load the state_dict (weights only)
-state_dict = torch.load(MODEL_PATH, map_location=torch.device("cpu"))
-model.load_state_dict(state_dict)
+# Cached image analysis: decode/preprocess in a dedicated pool, off the event loop,
+# and micro-batched forward passes shared by concurrent scans.
+# Built on the first scan (or warmup) so importing this module stays fast.
+pipeline = LazyScanPipeline()
 
-# Set to evaluation mode
-model.eval()
-
-
-# Define image preprocessing pipeline (must match training)
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std=[0.229, 0.224, 0.225])
-])
-
-# Index-to-label mapping (based on training classes)
-idx_to_label = {
-    0: "healthy",
-    1: "wilted"
-}
-def extract_leaf_features(img: Image.Image) -> dict:
-    """
-    Analyze leaf image and extract basic visual features.
-    Returns features in the format required by calculate_leaf_score.
-    """
-    np_img = np.array(img)
-
-    # Convert to HSV for better color segmentation
-    hsv = np.array(img.convert("HSV"))
-
-    # --- Color Features ---
-    yellow_mask = ((hsv[:, :, 0] >= 20) & (hsv[:, :, 0] <= 40)) & (hsv[:, :, 1] > 50)
-    brown_mask = ((hsv[:, :, 0] >= 10) & (hsv[:, :, 0] <= 20)) & (hsv[:, :, 1] > 30)
-
-    yellow_ratio = yellow_mask.sum() / (np_img.shape[0] * np_img.shape[1])
-    brown_pixels = brown_mask.sum()
-
-    # --- Shape Features (dummy logic, improve later) ---
-    irregularity = 0.3  # Fixed for now
-    holes_detected = False  # Not implemented yet
-
-    return {
-        "color": {
-            "yellow_ratio": round(float(yellow_ratio), 2),
-            "brown": int(brown_pixels)
-        },
-        "shape": {
-            "irregularity": irregularity,
-            "holes_detected": holes_detected
-        }
-    }
 @router.post("/scan", summary="Scan Leaf Health", description="Upload a leaf image and optional environment data to analyze plant health.")
 async def scan_leaf(
     image: UploadFile = File(..., description="Leaf image (.jpg/.png)"),
@@ -110,31 +54,74 @@ async def scan_leaf(
     - components.env_bonus: Scored from light & soil inputs (range: -10 to +10)
     """
     try:
-        # 1. Read and open image
+        # 1. Read image
         contents = await image.read()
-        img = Image.open(BytesIO(contents)).convert("RGB")
 
-        # 2. Preprocess and predict with model
-        input_tensor = transform(img).unsqueeze(0)
-        with torch.no_grad():
-            output = model(input_tensor)
-            probs = torch.nn.functional.softmax(output[0], dim=0)
-            confidence, pred_idx = torch.max(probs, dim=0)
-            label = idx_to_label[int(pred_idx)]
+        # 2. Predict with model + extract leaf features (cached per image and model version)
+        analysis = await pipeline.analyze(contents)
+        label = analysis["label"]
+        leaf_features = analysis["leaf_features"]
 
         # 3. Score environment based on inputs
         env_bonus, env_comments = calculate_environment_bonus(soil_moisture, light_level)
 
         # 4. Compute final health score and suggestions
-        leaf_features = extract_leaf_features(img)
-
         result = calculate_health_score(
             leaf_features=leaf_features,
             soil_moisture=soil_moisture,
             light_level=light_level
         )
+        result["model_version"] = analysis["model_version"]
 
         return result
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.post("/scan_batch", summary="Batch Scan Leaf Health", description="Upload many leaf images (or a .zip/.tar of them) and stream one health report per image as NDJSON.")
+async def scan_leaf_batch(
+    images: List[UploadFile] = File(..., description="Leaf images (.jpg/.png) and/or .zip/.tar archives of them"),
+    light_level: List[float] = Form([], description="Light level per image, in upload order (default 50)"),
+    soil_moisture: List[float] = Form([], description="Soil moisture per image, in upload order (default 50)"),
+    metadata: str = Form(None, description='Optional JSON {"filename": {"light_level": .., "soil_moisture": ..}}')
+):
+    """
+    Batch version of /leaf/scan for greenhouse sessions.
+
+    All images are analysed concurrently through the shared scan pipeline, so
+    the batching engine runs them as full forward-pass batches. The response
+    streams one JSON line per image as soon as it is ready (completion order):
+    the calculate_health_score report plus `index` (position after archive
+    expansion) and `filename`, or `index`, `filename` and `error`.
+    """
+    try:
+        uploads = [(upload.filename, await upload.read()) for upload in images]
+        items = await run_in_threadpool(build_batch_items, uploads, light_level, soil_moisture, metadata)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    return StreamingResponse(stream_scan_results(pipeline, items), media_type="application/x-ndjson")
+
+
+@router.post("/reload", summary="Reload Leaf Model")
+async def reload_leaf_model():
+    """
+    Start loading the model registry's active version in the background and
+    return 202 with the target version; the model is swapped in once warm.
+    Requests already running finish on the previous model. Progress and
+    errors are reported by /leaf/metrics.
+    """
+    try:
+        return JSONResponse(status_code=202, content=await run_in_threadpool(pipeline.start_reload))
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/metrics", summary="Leaf Inference Metrics")
+def get_inference_metrics():
+    """
+    Report inference executor concurrency limits/usage, micro-batching counters
+    and scan cache statistics.
+    """
+    return pipeline.metrics()
@@ -1,3 +1,6 @@
+import os
+import time
+
 from fastapi import FastAPI, File, Form, UploadFile
 from achievement_api import app as achievement_app
 from avatar_uploader import app as avatar_app
@@ -8,7 +11,10 @@ from check_achievements import check_achievements
 from achievement_api import get_achievement_progress, check_and_draw_lottery
 from dream_chat_api import app as chat_app
 from plant_log_api import router as plant_log_router
-from leaf_api import router as leaf_router
+from leaf_api import router as leaf_router, pipeline as leaf_pipeline
+
+# Heavy libraries and models load on first use unless LAZY_STARTUP=0
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") != "0"
 
 app = FastAPI()
 app.include_router(plant_log_router)
@@ -48,6 +54,25 @@ def achievement_progress_api(user_id: str):
 def draw_lottery_api(user_id: str):
     return check_and_draw_lottery(user_id)
 
+def warmup() -> dict:
+    """Import heavy libraries and load models now instead of on the first request."""
+    timings = {}
+    for name, load in [("scan_pipeline", leaf_pipeline.warmup),
+                       ("pandas", lambda: __import__("pandas"))]:
+        start = time.perf_counter()
+        load()
+        timings[name] = round(time.perf_counter() - start, 3)
+    return timings
+
+@app.on_event("startup")
+def eager_startup():
+    if not LAZY_STARTUP:
+        print("[Startup] Warmup:", warmup())
+
+@app.post("/warmup")
+def warmup_route():
+    return {"status": "warm", "seconds": warmup()}
+
 @app.get("/")
 def root():
     return {"message": "Grow AI backend is running + achievement route included"}
@@ -22,7 +22,7 @@ env_path = Path(__file__).parent / ".env_user"
 load_dotenv(dotenv_path=env_path)
 MONGO_URI = os.getenv("MONGODB_URI")
 
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["user_data"]
 plant_log = db["plant_log"]
 
@@ -23,7 +23,7 @@ load_dotenv(dotenv_path=env_path)
 
 # Establish connection
 MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, connect=False)
 db = client["user_data"]
 collection = db["users"]
 
@@ -49,6 +49,10 @@ def delete_user(user_id: str):
 def list_users():
     """Return a list of all user profiles without MongoDB _id field."""
     return list(collection.find({}, {"_id": 0}))
+def list_user_locations():
+    """Return the `location` ({lat, lon}) of every user that has one."""
+    return [user["location"] for user in collection.find({"location": {"$exists": True}}, {"_id": 0, "location": 1})]
+
 def get_user_plants(user_id: str):
     """Return a list of all plant profiles owned by a user."""
     user = collection.find_one({"user_id": user_id}, {"_id": 0, "plants": 1})